@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from requests.adapters import HTTPAdapter
+from threading import Event, Lock, Thread
+from time import monotonic
+from twitchez import conf
+from twitchez import ratelimit
+from twitchez import settings
+from urllib.parse import urlparse
+import requests
+import socket
+
+HELIX_URL = "https://api.twitch.tv/helix"
+
+# exceptions of the requests made without network connection (or with flaky one)
+NETWORK_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+# min interval in secs between connectivity probes while offline
+PROBE_INTERVAL = 15
+
+# max number of retries of the helix request after 429 (Too Many Requests)
+RETRIES_429 = 3
+
+
+def timeouts() -> tuple[float, float]:
+    """Return (connect, read) timeouts in seconds for each request (re-read after config reload)."""
+    return float(conf.setting("connect_timeout")), float(conf.setting("read_timeout"))
+
+
+class Client:
+    """Shared HTTP client with persistent (keep-alive) connection pool.
+    All requests to the twitch API should go through the single CLIENT object,
+    so the TCP & TLS handshakes are made only once per host.
+    """
+
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=1)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.auth_headers = {}
+        self.limiter = ratelimit.RateLimiter()
+        self.offline = self.forced_offline
+        self.probed = monotonic()
+        self.probing = Lock()  # held while connectivity probe is running
+
+    @property
+    def forced_offline(self) -> bool:
+        """offline_mode is set in config (re-read after config reload)."""
+        return settings.CURRENT.offline_mode
+
+    def set_auth(self, token: str, c_id: str):
+        """Prebuild auth headers sent with each helix request."""
+        if self.auth_headers.get("Client-Id") == c_id and \
+                self.auth_headers.get("Authorization") == f"Bearer {token}":
+            return  # already set
+        self.auth_headers = {
+            "Authorization": f"Bearer {token}",
+            "Client-Id": c_id
+        }
+
+    def reset_auth(self):
+        """Forget auth headers (e.g. after the token was invalidated)."""
+        self.auth_headers = {}
+
+    def get(self, url: str, params=None, headers=None, timeout=None) -> requests.Response:
+        """GET request via pooled session (timeout => timeouts() from config if not passed).
+        Network errors switch client into the offline state (till the next successful probe).
+        """
+        timeout = timeout or timeouts()
+        try:
+            r = self.session.get(url, params=params, headers=headers, timeout=timeout)
+        except NETWORK_ERRORS:
+            self.offline = True
+            self.probed = monotonic()
+            raise
+        self.offline = self.forced_offline
+        return r
+
+    def probe(self) -> bool:
+        """Quick connectivity probe: try to open TCP connection to the API host."""
+        u = urlparse(HELIX_URL)
+        port = u.port or (443 if u.scheme == "https" else 80)
+        try:
+            with socket.create_connection((u.hostname, port), timeout=timeouts()[0]):
+                return True
+        except OSError:
+            return False
+
+    def probe_in_background(self):
+        """Probe connectivity & update offline state (lock is released when done)."""
+        try:
+            self.offline = not self.probe()
+            self.probed = monotonic()
+        finally:
+            self.probing.release()
+
+    def is_online(self) -> bool:
+        """Return False if offline: offline_mode is set or network is not reachable.
+        While offline the connectivity is probed again not more often than PROBE_INTERVAL
+        in the background thread (last known state is returned at once).
+        """
+        if self.forced_offline:
+            return False
+        if self.offline and monotonic() - self.probed > PROBE_INTERVAL and self.probing.acquire(blocking=False):
+            self.probed = monotonic()
+            Thread(target=self.probe_in_background, daemon=True).start()
+        return not self.offline
+
+    def helix(self, endpoint: str, params=None, timeout=None, headers=None) -> requests.Response:
+        """GET request to the helix endpoint with prebuilt auth headers (+ optional headers).
+        Each request waits for its turn in the rate limiter (by the thread priority),
+        on 429 response the request is retried after the bucket reset.
+        """
+        if self.forced_offline:
+            raise requests.ConnectionError("offline_mode is enabled in config.")
+        url = f"{HELIX_URL}/{endpoint}"
+        if headers:
+            headers = {**self.auth_headers, **headers}
+        else:
+            headers = self.auth_headers
+        prio = ratelimit.priority()
+        attempt = 0
+        while True:
+            self.limiter.acquire(prio)
+            r = self.get(url, params, headers, timeout)
+            self.limiter.update(r.headers)
+            if r.status_code != 429 or attempt >= RETRIES_429:
+                return r
+            self.limiter.backoff(r.headers, attempt)
+            attempt += 1
+
+    def close(self):
+        self.session.close()
+
+
+def conditional_headers(validators: dict) -> dict:
+    """Return headers of the conditional request by the validators of the cached response."""
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+def response_validators(headers) -> dict:
+    """Return validators (ETag, Last-Modified) of the response to store next to the cached data."""
+    validators = {}
+    if headers.get("ETag"):
+        validators["etag"] = headers["ETag"]
+    if headers.get("Last-Modified"):
+        validators["last_modified"] = headers["Last-Modified"]
+    return validators
+
+
+class Call:
+    """In-flight call of the SingleFlight."""
+
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one in-flight call.
+    Callers which came while the call is in-flight wait for it
+    and get the same result (or the same exception).
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.calls = {}
+
+    def do(self, key, func, *args):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
+
+
+CLIENT: Client = Client()
+FLIGHT: SingleFlight = SingleFlight()
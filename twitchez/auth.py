@@ -2,9 +2,9 @@
 # coding=utf-8
 
 from random import randint
+from twitchez.api import CLIENT, HELIX_URL
 from twitchez.clip import clip
-from twitchez.data import write_private_data
-import requests
+from twitchez.creds import CREDS
 
 
 def generate_nonce(length=8):
@@ -14,13 +14,13 @@ def generate_nonce(length=8):
 
 def get_user_id(token, c_id):
     """Get user id by access token."""
-    url = "https://api.twitch.tv/helix/users"
+    url = f"{HELIX_URL}/users"
     headers = {
         "Authorization": f"Bearer {token}",
         "Client-Id": c_id
     }
     try:
-        r = requests.get(url, headers=headers)
+        r = CLIENT.get(url, headers=headers)
     except Exception as err:
         raise Exception(err)
     return(r.json()['data'][0]['id'])
@@ -43,7 +43,7 @@ def get_auth_token():
         f"&state={state}"
     ))
     try:
-        r = requests.get(url)
+        r = CLIENT.get(url)
     except Exception as err:
         raise Exception(err)
     if state in r.url:  # for safety check that 'state' is substring in response url
@@ -61,7 +61,7 @@ def get_auth_token():
         # try to get user_id by new access_token & validate that user put right access_token
         user_id = get_user_id(access_token, client_id)
         # write to private file for using in further requests
-        write_private_data(user_id, access_token, client_id)
+        CREDS.write(user_id, access_token, client_id)
         print("SUCCESS")
     else:
         print(f"original state: '{state}' not matches state in response!")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from twitchez import settings
+
+from threading import Lock
+
+# weight of the new measurement in the moving averages
+ALPHA = 0.3
+
+# quality levels of the thumbnails
+FULL = 0  # full resolution, screens around the visible one are prefetched while idle
+HALF = 1  # half resolution
+LOW = 2  # quarter resolution, only visible thumbnails are downloaded
+
+# resolution divisor by the level
+SCALE = {FULL: 1, HALF: 2, LOW: 4}
+# label of the level in the header indicator
+LABELS = {FULL: "", HALF: " half", LOW: " low"}
+
+# throughput (bytes/s) below which thumbnails quality is lowered to the level,
+# quality goes back up only when throughput is RECOVERY times higher (no flapping)
+THRESHOLDS = {HALF: 256 * 1024, LOW: 64 * 1024}
+RECOVERY = 2
+
+# mean latency (secs) above which only visible thumbnails are downloaded
+SLOW_LATENCY = 1.5
+
+# min transfer time of the batch (small images often arrive with the response headers)
+MIN_SECS = 0.01
+
+
+def average(avg: float, value: float) -> float:
+    """Exponential moving average (the first value is taken as is)."""
+    if not avg:
+        return value
+    return avg + ALPHA * (value - avg)
+
+
+class Sample:
+    """Measurement of the batch of the thumbnails downloads."""
+
+    def __init__(self):
+        self.nbytes = 0  # received bytes of the images
+        self.latencies = []  # secs to the response headers of each request
+        self.transfers = []  # (start, end) monotonic times of the images bodies transfer
+
+    def transfer_secs(self) -> float:
+        """Return time during which at least one image body was transferred
+        (simultaneous transfers are counted once).
+        """
+        secs = 0.0
+        last = 0.0
+        for start, end in sorted(self.transfers):
+            start = max(start, last)
+            if end > start:
+                secs += end - start
+                last = end
+        return secs
+
+
+class Meter:
+    """Measured throughput & latency of the thumbnails downloads (moving averages)
+    and the quality level of the thumbnails chosen by them.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.throughput = 0.0  # bytes/s (0 => not measured yet)
+        self.latency = 0.0  # secs
+        self.level = FULL
+
+    def add(self, sample: Sample) -> int:
+        """Add measurement of the downloaded batch & return quality level."""
+        with self.lock:
+            if sample.latencies:
+                latency = sum(sample.latencies) / len(sample.latencies)
+                self.latency = average(self.latency, latency)
+            if sample.nbytes:
+                secs = max(sample.transfer_secs(), MIN_SECS)
+                self.throughput = average(self.throughput, sample.nbytes / secs)
+            self.level = self.choose_level()
+            return self.level
+
+    def choose_level(self) -> int:
+        if not self.throughput:
+            return self.level
+        level = self.level
+        while level < LOW and self.throughput < THRESHOLDS[level + 1]:
+            level += 1
+        while level > FULL and self.throughput >= THRESHOLDS[level] * RECOVERY:
+            level -= 1
+        return level
+
+    def quality(self) -> int:
+        """Return quality level of the thumbnails (FULL if adaptive_thumbnails is disabled)."""
+        if not settings.CURRENT.adaptive_thumbnails:
+            return FULL
+        return self.level
+
+    def scale(self) -> int:
+        """Return divisor of the thumbnails resolution."""
+        return SCALE[self.quality()]
+
+    def viewport_only(self) -> bool:
+        """Return True if only visible thumbnails should be downloaded (slow network)."""
+        if not settings.CURRENT.adaptive_thumbnails:
+            return False
+        return self.level == LOW or self.latency > SLOW_LATENCY
+
+    def indicator(self) -> str:
+        """Return header indicator of the measured throughput & lowered quality ("" if not measured)."""
+        if not self.throughput or settings.CURRENT.text_mode or not settings.CURRENT.adaptive_thumbnails:
+            return ""
+        kbs = self.throughput / 1024
+        speed = f"{kbs:.0f}K/s" if kbs < 1024 else f"{kbs / 1024:.1f}M/s"
+        return f"[{speed}{LABELS[self.level]}]"
+
+
+METER: Meter = Meter()
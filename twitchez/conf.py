@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
 # coding=utf-8
 
-from configparser import ConfigParser, NoSectionError
+from configparser import ConfigParser
 from pathlib import Path
 from twitchez import TWITCHEZDIR, fs
+from twitchez.state import state_file
 
 
 def read_conf(*configs):
@@ -34,6 +35,13 @@ config = read_conf(glob_conf, user_conf)
 keymap = read_conf(glob_keys, user_keys)
 
 
+def reload():
+    """Re-read config & keys files."""
+    global config, keymap
+    config = read_conf(glob_conf, user_conf)
+    keymap = read_conf(glob_keys, user_keys)
+
+
 def setting(keyname):
     found = config.get("GENERAL", keyname)
     return found
@@ -46,26 +54,12 @@ def key(keyname):
 
 def tmp_set(option, value, section="GENERAL"):
     """Set tmp variable value."""
-    temp = ConfigParser()
-    temp.read(temp_vars)
-    if not temp.has_section(section):
-        temp.add_section(section)
-    temp.set(str(section), str(option), str(value))
-    with open(temp_vars, "w") as f:
-        temp.write(f, space_around_delimiters=False)
+    state_file(temp_vars).set(str(section), str(option), value)
 
 
 def tmp_get(keyname, fallback, section="GENERAL"):
     """Get tmp variable value."""
-    temp = ConfigParser()
-    temp.read(temp_vars)
-    if not temp.has_section(section):
-        temp.add_section(section)
-    if fallback or not temp.has_option(section, keyname):
-        found = temp.get(section, keyname, fallback=fallback)
-    else:
-        found = temp.get(section, keyname)
-    return found
+    return state_file(temp_vars).get(section, keyname, fallback=fallback)
 
 
 def cfpath(fallback: Path, fpath="") -> Path:
@@ -81,55 +75,26 @@ def dta_file(fpath="") -> Path:
     return cfpath(data_vars, fpath)
 
 
-def cp_dta(fpath: Path) -> tuple[ConfigParser, Path]:
-    """Set defaults, read config & return class object."""
-    fpath = dta_file(fpath.as_posix())
-    dta = ConfigParser()
-    # fix: preserve capitalization (option as is without transformation)
-    # read more: https://docs.python.org/3/library/configparser.html#ConfigParser.optionxform(option)
-    dta.optionxform = lambda option: option
-    dta.read(fpath)
-    return dta, fpath
+def dta_state(fpath=""):
+    """Return state of the data file (or the default data file)."""
+    return state_file(dta_file(fpath), preserve_case=True)
 
 
 def dta_set(option, value, section="GENERAL", fpath=""):
     """Set data variable value."""
-    fpath = dta_file(fpath)
-    dta, fp = cp_dta(fpath)
-    if not dta.has_section(section):
-        dta.add_section(section)
-    dta.set(str(section), str(option), str(value))
-    with open(fp, "w") as f:
-        dta.write(f, space_around_delimiters=False)
+    dta_state(fpath).set(str(section), str(option), value)
 
 
 def dta_get(option, fallback, section="GENERAL", fpath=""):
     """Get data variable value."""
-    fpath = dta_file(fpath)
-    dta, _ = cp_dta(fpath)
-    if not dta.has_section(section):
-        dta.add_section(section)
-    if fallback or not dta.has_option(section, option):
-        found = dta.get(section, option, fallback=fallback)
-    else:
-        found = dta.get(section, option)
-    return found
+    return dta_state(fpath).get(section, option, fallback=fallback)
 
 
 def dta_rmo(option: str, section="GENERAL", fpath=""):
     """Remove data option."""
-    fpath = dta_file(fpath)
-    dta, fp = cp_dta(fpath)
-    dta.remove_option(section, option)
-    with open(fp, "w") as f:
-        dta.write(f, space_around_delimiters=False)
+    dta_state(fpath).remove(section, option)
 
 
 def dta_list(section="GENERAL", fpath="") -> list:
     """Return a list of (name, value) tuples for each option in a section."""
-    fpath = dta_file(fpath)
-    dta, _ = cp_dta(fpath)
-    try:
-        return dta.items(section)
-    except NoSectionError:
-        return []
+    return dta_state(fpath).items(section)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from pathlib import Path
+from twitchez import fs
+import json
+
+
+class Credentials:
+    """In-memory cache of the private data used for authentication.
+    The .private file is read & parsed only once,
+    and read again only if file mtime was changed or cache was invalidated.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.mtime = 0.0
+        self.path = Path()
+
+    def file_path(self) -> Path:
+        if not self.path.name:
+            self.path = fs.private_data_path()
+        return self.path
+
+    def load(self) -> dict:
+        """Return cached private data, (re)read file only if it was changed."""
+        path = self.file_path()
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            self.invalidate()
+            path = self.file_path()
+            mtime = path.stat().st_mtime
+        if not self.data or mtime != self.mtime:
+            with open(path, "r") as file:
+                self.data = json.load(file)
+            self.mtime = mtime
+        return self.data
+
+    def get(self, key) -> str:
+        """Get value by the key."""
+        return self.load()[key]
+
+    def write(self, user_id, access_token, client_id):
+        """Write private data to file & update cache."""
+        self.invalidate()
+        file_path = fs.private_data_path(recreate=True)
+        data = {
+            "u_id": user_id,
+            "token": access_token,
+            "c_id": client_id
+        }
+        with open(file_path, "w") as file:
+            json.dump(data, file, indent=4)
+        self.path = file_path
+        self.mtime = file_path.stat().st_mtime
+        self.data = data
+
+    def invalidate(self):
+        """Forget cached data, the file will be read again on the next access."""
+        self.data = {}
+        self.mtime = 0.0
+        self.path = Path()
+
+
+CREDS: Credentials = Credentials()
@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 # coding=utf-8
 
-from pathlib import Path
-from requests import get
 from twitchez import fs
-import json
+from twitchez.api import CLIENT, FLIGHT, conditional_headers, response_validators
+from twitchez.creds import CREDS
+
+# key of the response validators (ETag, Last-Modified) stored in json data
+VALIDATORS = "validators"
 
 
 def validate_data(d :dict):
@@ -16,68 +18,57 @@ def validate_data(d :dict):
         return
     # ^ if status code not 0 -> status code processing
     if status == 401: # Invalid OAuth token
+        CLIENT.reset_auth()
+        CREDS.invalidate()
         fs.private_data_path(recreate=True)
         # message to the user
         a = "Invalid OAuth token! (probably the old token has expired)"
         b = "Launch application again to generate new OAuth token."
         raise Exception(f"{str(d)}\n^{a}\n{b}")
+    elif status == 429: # Too Many Requests (even after retries)
+        a = "Twitch API rate limit exceeded! Wait a minute and try again."
+        raise Exception(f"{str(d)}\n^{a}")
     else:
         a = "returned request data:"
         b = "*** Unhandled status code! ***"
         raise Exception(f"{a}\n{str(d)}\n{b} ({status})")
 
 
-def write_private_data(user_id, access_token, client_id):
-    """Write private data to file for using in further requests."""
-    file_path = fs.private_data_path(recreate=True)
-    data = {
-        "u_id": user_id,
-        "token": access_token,
-        "c_id": client_id
-    }
-    with open(file_path, "w") as file:
-        json.dump(data, file, indent=4)
+def get_private_data(key) -> str:
+    """Get value by the key from .private file (cached in memory)."""
+    return CREDS.get(key)
 
 
-def get_private_data(key) -> str:
-    """Get value by the key from .private file."""
-    file_path = fs.private_data_path()
-    with open(file_path, "r") as file:
-        data = json.load(file)
-    return data[key]
-
-
-def cache_file_path(file_name, *subdirs) -> Path:
-    """Get cache file path by file name, optionally supports subdirs."""
-    if subdirs:
-        path = Path(fs.get_cache_dir(), *subdirs)
-        path.mkdir(parents=True, exist_ok=True)
-    else:
-        path = fs.get_cache_dir()
-    return Path(path, file_name)
+def helix_fetch(endpoint: str, params: dict, validators=None) -> dict:
+    """Get json data from the helix endpoint via shared client & validate it.
+    If validators of the cached data are passed => make conditional request,
+    and return empty dict if data was not modified.
+    """
+    private = CREDS.load()
+    CLIENT.set_auth(private["token"], private["c_id"])
+    headers = conditional_headers(validators) if validators else None
+    r = CLIENT.helix(endpoint, params, headers=headers)
+    if r.status_code == 304:
+        return {}
+    d = r.json()
+    validate_data(d)
+    resp_validators = response_validators(r.headers)
+    if resp_validators:
+        d[VALIDATORS] = resp_validators
+    return d
 
 
-def update_cache(file_name, json_data, *subdirs) -> Path:
-    """Update json file from cache and return file path."""
-    if subdirs:
-        file_path = cache_file_path(file_name, *subdirs)
-    else:
-        file_path = cache_file_path(file_name)
-    data = json.dumps(json_data, indent=2)
-    with open(file_path, "w") as file:
-        file.write(data)
-    return file_path
+def helix_get(endpoint: str, params: dict, validators=None) -> dict:
+    """Get json data from the helix endpoint,
+    concurrent identical requests are coalesced into one request.
+    """
+    key = (endpoint, tuple(sorted(params.items())), tuple(sorted((validators or {}).items())))
+    return FLIGHT.do(key, helix_fetch, endpoint, params, validators)
 
 
-def read_cache(file_name, *subdirs) -> dict:
-    """Read json file from cache and return data."""
-    if subdirs:
-        file_path = cache_file_path(file_name, *subdirs)
-    else:
-        file_path = cache_file_path(file_name)
-    with open(file_path, "r") as file:
-        data = json.load(file)
-    return data
+def not_modified(json_data) -> bool:
+    """Return True if the data of conditional request was not modified (304)."""
+    return not json_data
 
 
 def get_entries(json_data, key, root_key='data') -> list:
@@ -88,44 +79,43 @@ def get_entries(json_data, key, root_key='data') -> list:
     return found
 
 
-def create_id_dict(json_data) -> dict:
-    """Create and return dict with id as the key."""
-    streams = {}
-    ids = get_entries(json_data, 'id')
-    for stream, id in zip(json_data['data'], ids):
-        streams[id] = stream
-    return streams
+def next_cursor(json_data) -> str:
+    """Return cursor of the next page of data or empty string if there is no next page."""
+    return json_data.get("pagination", {}).get("cursor", "")
+
+
+def extend_page_data(json_data, next_data) -> list:
+    """Append entries of the next page to the json data & replace the cursor.
+    Entries which are already in the json data are skipped
+    (the list may shift between requests, e.g. viewer count of live streams changed).
+    Return list of newly added entries.
+    """
+    ids = set(get_entries(json_data, 'id'))
+    new_entries = [e for e in next_data['data'] if e['id'] not in ids]
+    json_data['data'].extend(new_entries)
+    json_data['pagination'] = next_data.get('pagination', {})
+    return new_entries
+
+
+def with_cursor(params: dict, after: str) -> dict:
+    """Add cursor of the page to the request params."""
+    if after:
+        params["after"] = after
+    return params
 
 
-def following_live_data() -> dict:
+def following_live_data(after="", validators=None) -> dict:
     """Return data of user 'following live channels' page."""
+    first = 100  # Maximum number of objects to return. (Twitch API Maximum: 100)
     u_id = get_private_data("u_id")    # user_id
-    token = get_private_data("token")  # auth token
-    c_id = get_private_data("c_id")    # client-Id of this program
-    url = f"https://api.twitch.tv/helix/streams/followed?user_id={u_id}"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Client-Id": c_id
-    }
-    r = get(url, headers=headers)
-    d = r.json()
-    validate_data(d)
-    return d
+    params = {"first": first, "user_id": u_id}
+    return helix_get("streams/followed", with_cursor(params, after), validators)
 
 
 def get_categories(query: str) -> list:
     """Returns a list of categories that match the query via name either entirely or partially."""
     first = 100  # Maximum number of objects to return. (Twitch API Maximum: 100)
-    token = get_private_data("token")
-    c_id = get_private_data("c_id")
-    url = f"https://api.twitch.tv/helix/search/categories?first={first}&query={query}"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Client-Id": c_id
-    }
-    r = get(url, headers=headers)
-    d = r.json()
-    validate_data(d)
+    d = helix_get("search/categories", {"first": first, "query": query})
     return d["data"]
 
 
@@ -153,19 +143,11 @@ def get_categories_terse_mulstr(query: str) -> str:
     return mstr.strip()  # to remove blank line
 
 
-def category_data(category_id) -> dict:
+def category_data(category_id, after="", validators=None) -> dict:
     """Return json data for streams in certain category."""
     first = 100  # Maximum number of objects to return. (Twitch API Maximum: 100)
-    token = get_private_data("token")
-    c_id = get_private_data("c_id")
-    url = f"https://api.twitch.tv/helix/streams?first={first}&game_id={category_id}"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Client-Id": c_id
-    }
-    r = get(url, headers=headers)
-    d = r.json()
-    validate_data(d)
+    params = {"first": first, "game_id": category_id}
+    d = helix_get("streams", with_cursor(params, after), validators)
     return d
 
 
@@ -174,16 +156,8 @@ def get_channels(query: str, live_only=False) -> dict:
     (users who have streamed within the past 6 months)
     """
     first = 5  # Maximum number of objects to return. (Twitch API Maximum: 100)
-    token = get_private_data("token")
-    c_id = get_private_data("c_id")
-    url = f"https://api.twitch.tv/helix/search/channels?first={first}&live_only={str(live_only)}&query={query}"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Client-Id": c_id
-    }
-    r = get(url, headers=headers)
-    d = r.json()
-    validate_data(d)
+    params = {"first": first, "live_only": str(live_only), "query": query}
+    d = helix_get("search/channels", params)
     return d["data"]
 
 
@@ -208,50 +182,38 @@ def get_channels_terse_mulstr(query: str, live_only=False) -> str:
     return mstr.strip()  # to remove blank line
 
 
-def get_channel_videos(user_id, type="all") -> dict:
+def get_channel_videos(user_id, type="all", after="", validators=None) -> dict:
     """Gets videos information by user ID."""
     first = 100  # Maximum number of objects to return. (Twitch API Maximum: 100)
-    token = get_private_data("token")
-    c_id = get_private_data("c_id")
-    url = f"https://api.twitch.tv/helix/videos?type={type}&first={first}&user_id={user_id}"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Client-Id": c_id
-    }
-    r = get(url, headers=headers)
-    d = r.json()
-    validate_data(d)
+    params = {"type": type, "first": first, "user_id": user_id}
+    d = helix_get("videos", with_cursor(params, after), validators)
     return d
 
 
-def get_channel_clips(broadcaster_id) -> dict:
+def get_channel_clips(broadcaster_id, after="", validators=None) -> dict:
     """Gets clips information by broadcaster ID."""
     first = 100  # Maximum number of objects to return. (Twitch API Maximum: 100)
-    token = get_private_data("token")
-    c_id = get_private_data("c_id")
-    url = f"https://api.twitch.tv/helix/clips?first={first}&broadcaster_id={broadcaster_id}"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Client-Id": c_id
-    }
-    r = get(url, headers=headers)
-    d = r.json()
-    validate_data(d)
+    params = {"first": first, "broadcaster_id": broadcaster_id}
+    d = helix_get("clips", with_cursor(params, after), validators)
     return d
 
 
-def page_data(page_dict) -> dict:
-    """Get and return page data based on page_dict."""
+def page_data(page_dict, after="", validators=None) -> dict:
+    """Get and return page data based on page_dict.
+    Optionally get the next page of data by the cursor (after).
+    Optionally make conditional request by the validators of the cached page data
+    (empty dict is returned if data was not modified).
+    """
     pd = page_dict
     ptype = pd.get("type", "streams")
     if ptype == "videos":
         if pd["category"] == "clips":
-            json_data = get_channel_clips(pd["user_id"])
+            json_data = get_channel_clips(pd["user_id"], after, validators)
         else:
-            json_data = get_channel_videos(pd["user_id"], pd["category"])
+            json_data = get_channel_videos(pd["user_id"], pd["category"], after, validators)
     else:
         if pd["category"] == "Following Live":
-            json_data = following_live_data()
+            json_data = following_live_data(after, validators)
         else:
-            json_data = category_data(pd["category_id"])
+            json_data = category_data(pd["category_id"], after, validators)
     return json_data
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from hashlib import sha1
+from pathlib import Path
+from threading import Lock, local
+from time import time
+from twitchez import fs
+
+import json
+import sqlite3
+
+# secs after which not used thumbnails are removed from the cache
+MAX_UNUSED_AGE = 30 * 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    validators TEXT NOT NULL DEFAULT '{}',
+    size INTEGER NOT NULL,
+    immutable INTEGER NOT NULL DEFAULT 0,
+    fetched REAL NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_used ON images (used);
+"""
+
+
+def image_key(rawurl: str, resolution: tuple[int, int]) -> str:
+    """Return cache key (also the file name) of the image by the url template & resolution."""
+    width, height = resolution
+    return f"{sha1(rawurl.encode()).hexdigest()}-{width}x{height}"
+
+
+class Entry:
+    """Cached image metadata."""
+    __slots__ = ("validators", "immutable", "fetched")
+
+    def __init__(self, validators: dict, immutable: bool, fetched: float):
+        self.validators = validators
+        self.immutable = immutable
+        self.fetched = fetched  # time of the last download/revalidation
+
+    def is_fresh(self, max_age: float) -> bool:
+        """Return True if image may be used without request (immutable or fetched recently)."""
+        return self.immutable or time() - self.fetched < max_age
+
+
+class ImageCache:
+    """Persistent cache of the thumbnails shared by all pages.
+    Images are stored once per url & resolution (the same stream in several tabs
+    is downloaded once), the index (SQLite) keeps validators & times of use.
+    Least recently used images are evicted when the cache size limit is exceeded
+    or if they were not used for MAX_UNUSED_AGE.
+    """
+
+    def __init__(self, path: Path, dir: Path):
+        self.path = path
+        self.dir = dir
+        self.local = local()  # sqlite connection per thread
+        self.lock = Lock()
+        # usage stats since the start
+        self.counters = {"hits": 0, "revalidated": 0, "downloaded": 0, "failed": 0}
+
+    def db(self) -> sqlite3.Connection:
+        con = getattr(self.local, "con", None)
+        if con is None:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            con = sqlite3.connect(self.path, timeout=10)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.executescript(SCHEMA)
+            self.local.con = con
+        return con
+
+    def file(self, key: str) -> Path:
+        return Path(self.dir, f"{key}.jpg")
+
+    def lookup(self, keys: list) -> dict:
+        """Return {key: Entry} of the cached images (with existing files) & mark them as used."""
+        keys = [k for k in set(keys) if k]
+        entries = {}
+        with self.db() as con:
+            for i in range(0, len(keys), 500):  # max number of sql variables
+                chunk = keys[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = con.execute(f"SELECT key, validators, immutable, fetched FROM images WHERE key IN ({marks})", chunk)
+                for key, validators, immutable, fetched in rows:
+                    if self.file(key).is_file():
+                        entries[key] = Entry(json.loads(validators), bool(immutable), fetched)
+                con.execute(f"UPDATE images SET used=? WHERE key IN ({marks})", (time(), *chunk))
+        return entries
+
+    def put(self, key: str, url: str, validators: dict, immutable: bool):
+        """Add (or replace) downloaded image to the index."""
+        now = time()
+        size = self.file(key).stat().st_size
+        with self.db() as con:
+            con.execute("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (key, url, json.dumps(validators), size, int(immutable), now, now))
+        self.count("downloaded")
+
+    def touch(self, key: str):
+        """Mark image as revalidated (not modified since the last download)."""
+        with self.db() as con:
+            con.execute("UPDATE images SET fetched=? WHERE key=?", (time(), key))
+        self.count("revalidated")
+
+    def count(self, counter: str, n=1):
+        with self.lock:
+            self.counters[counter] += n
+
+    def evict(self, max_size: int, max_age=MAX_UNUSED_AGE):
+        """Remove least recently used images while cache size > max_size (bytes)
+        and images not used for max_age secs.
+        """
+        con = self.db()
+        total = con.execute("SELECT COALESCE(SUM(size), 0) FROM images").fetchone()[0]
+        expired = time() - max_age
+        removed = []
+        for key, size, used in con.execute("SELECT key, size, used FROM images ORDER BY used"):
+            if total <= max_size and used >= expired:
+                break
+            removed.append((key,))
+            total -= size
+        if not removed:
+            return
+        with con:
+            con.executemany("DELETE FROM images WHERE key=?", removed)
+        for key, in removed:
+            self.file(key).unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        """Return cache stats: number & size of the cached images and usage counters."""
+        count, size = self.db().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images").fetchone()
+        with self.lock:
+            return {"images": count, "size": size, **self.counters}
+
+
+CACHE: ImageCache = ImageCache(Path(fs.get_cache_dir(), "thumbnails.db"), Path(fs.get_cache_dir(), "thumbnails"))
@@ -4,14 +4,24 @@
 from twitchez import STDSCR
 from twitchez import keys
 from twitchez import keys_help
+from twitchez import pages
+from twitchez import prefetch
 from twitchez import render
+from twitchez import settings
+from twitchez import state
 from twitchez import tabs
 from twitchez import thumbnails
+from twitchez import utils
 from twitchez.keys import other_keys as k
 
 from collections.abc import Callable
 import curses
 
+# time in ms without input, after which idle work is done (e.g. redraw on new page data)
+IDLE_TIMEOUT = 500
+# the same while thumbnails are downloaded (to draw them soon after they arrived)
+BUSY_TIMEOUT = 100
+
 
 def set_curses_start_defaults():
     """Set curses start defaults."""
@@ -21,14 +31,21 @@ def set_curses_start_defaults():
 
 
 def wch() -> tuple[str, int, bool]:
-    """Handle exceptions, and return character variables with explicit type."""
+    """Handle exceptions, and return character variables with explicit type.
+    If there was no input during IDLE_TIMEOUT => return empty character variables.
+    """
     try:
+        STDSCR.timeout(BUSY_TIMEOUT if thumbnails.QUEUE.busy else IDLE_TIMEOUT)
         wch = STDSCR.get_wch()
     except KeyboardInterrupt:  # Ctrl+c etc.
         thumbnails.draw_stop(safe=True)
         STDSCR.clear()
         curses.endwin()
         return "", 0, True  # fail/interrupt is True => break
+    except curses.error:  # no input
+        return "", 0, False
+    finally:
+        STDSCR.timeout(-1)  # blocking read for all other functions
     # explicit type conversion to be absolutely sure about character type!
     ci = int(wch) if isinstance(wch, int) else 0  # int else fallback to 0
     ch = str(wch)
@@ -36,36 +53,44 @@ def wch() -> tuple[str, int, bool]:
 
 
 def handle_resize(ci: int, redraw: Callable, redrawall: Callable):
-    """Handle resize events, especially repeated resize -> simple redraw,
-    when repeated resize stopped -> redraw everything including thumbnails."""
-    if ci == curses.KEY_RESIZE:  # terminal resize event
-        thumbnails.draw_stop()
-        _rew = STDSCR.derwin(0, 0)  # resize event window (invisible)
-        _rew.timeout(300)
-        c = _rew.getch()
-        # if next character is also a resize event
-        if c == curses.KEY_RESIZE:
-            _rew.timeout(150)
-            # -> loop in simple redraw without thumbnails
-            while c == curses.KEY_RESIZE:
-                c = _rew.getch()
-                STDSCR.clear()
-                redraw()
-        redrawall()
-        return True
-    return False
+    """Handle resize events, queued resize events are folded into one redraw
+    without thumbnails, when resizing stopped -> redraw everything including thumbnails."""
+    if ci != curses.KEY_RESIZE:  # terminal resize event
+        return False
+    thumbnails.draw_stop()
+    while True:
+        # only the last terminal size matters
+        key = keys.read_key(0)
+        while key == curses.KEY_RESIZE:
+            key = keys.read_key(0)
+        if key is not None:
+            keys.unread_key(key)
+        redraw()  # simple redraw without thumbnails (only layout & text)
+        key = keys.read_key(keys.thumbnails_delay())
+        if key is None:
+            break
+        if key != curses.KEY_RESIZE:
+            keys.unread_key(key)
+            break
+    settings.resized()  # size of the terminal cells may be changed too
+    redrawall()
+    return True
 
 
 def show_pressed_chars(ch: str, ci: int):
     """Show last pressed key chars at the bottom-right corner."""
-    h, w = STDSCR.getmaxyx()
+    try:
+        win = render.RENDERER.keys_window()
+    except curses.error:  # terminal is too small
+        return
     try:
         if ci != 0:
-            STDSCR.insstr(h - 1, w - 8, f" ci:{ci} ")
+            win.insstr(0, 0, f" ci:{ci} ")
         else:
-            STDSCR.insstr(h - 1, w - 8, ch)
+            win.insstr(0, 0, ch)
     except ValueError:  # bypass ValueError: embedded null character
         pass
+    win.noutrefresh()
 
 
 def run(stdscr):
@@ -79,20 +104,40 @@ def run(stdscr):
     def redraw():
         """Reinitialize variables & redraw everything."""
         thumbnails.draw_stop()
-        STDSCR.clear()
         h, w = STDSCR.getmaxyx()
         if h < 3 or w < 3:
             return
         page.draw()
         thumbnails.draw_start()
 
+    def reload_config():
+        """Re-read config files & redraw everything with the new settings."""
+        settings.reload()
+        keys.reload()
+        utils.reset_widths()
+        pages.Pages.models.clear()  # e.g. thumbnails mode was changed
+        render.RENDERER.reset()
+        redraw()
+
     redraw()  # draw once just before the loop start
+    idle = False  # already idle since the last key press
 
     # Infinite loop to read every key press.
     while True:
         ch, ci, interrupt = wch()
         if interrupt:
             break
+        if not ch and not ci:  # idle
+            if settings.changed():
+                reload_config()  # user config files were edited
+            elif page.has_update():
+                redraw()  # new page data arrived from the background update
+            if not idle:
+                idle = True
+                prefetch.prefetch_neighbours()
+                thumbnails.QUEUE.prefetch()  # thumbnails of the previous/next screen
+            continue
+        idle = False
         if handle_resize(ci, page.draw, redraw):
             continue
         show_pressed_chars(ch, ci)
@@ -101,18 +146,26 @@ def run(stdscr):
             break
         if ch == k.get("redraw"):
             page = render.Page(page_dict)
+            render.RENDERER.invalidate()
+            STDSCR.clear()  # explicit full repaint of the terminal
             redraw()
             continue
+        if ch == k.get("reload_config"):
+            reload_config()
+            continue
+        if ch == k.get("thumbnails_stats"):
+            keys.thumbnails_stats()
+            continue
         if ch == k.get("redownload"):
             page = render.Page(page_dict, force_redownload=True)
             redraw()
             continue
         if ch == k.get("keys_help") or ci == curses.KEY_F1:
             keys_help.help()
+            render.RENDERER.invalidate()
             redraw()
             continue
         if ch == k.get("full_title"):
-            STDSCR.clear()
             fbox = render.Boxes.drawn_boxes[0]
             # toggle full title drawing
             if not fbox.fulltitle:
@@ -125,7 +178,7 @@ def run(stdscr):
             page = render.Page(page_dict)
             redraw()
             continue
-        if keys.scroll(ch, page.draw, redraw):
+        if keys.scroll(ch, page, redraw):
             continue
         if ch in keys.tab_keys.values():
             page_dict = keys.tabs_action(ch, page_dict)
@@ -135,12 +188,13 @@ def run(stdscr):
         if keys.yank(ch):
             continue
         if ch in keys.hint_keys.values():
-            if keys.hints(ch):
+            opened = keys.hints(ch)
+            render.RENDERER.invalidate()  # erase hints
+            if opened:
                 # redraw all including thumbnails
                 redraw()
             else:
                 # simple redraw without thumbnails
-                STDSCR.clear()
                 page.draw()
             continue
     # end of the infinite while loop
@@ -151,6 +205,7 @@ def main():
         curses.wrapper(run)
     finally:
         thumbnails.draw_stop(safe=True)
+        state.flush()  # write changed ui state (tabs, grid index etc.)
 
 
 if __name__ == "__main__":
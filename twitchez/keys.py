@@ -4,7 +4,10 @@
 from twitchez import STDSCR
 from twitchez import bmark
 from twitchez import data
+from twitchez import prefetch
 from twitchez import search
+from twitchez import settings
+from twitchez import source
 from twitchez import tabs
 from twitchez import thumbnails
 from twitchez import utils
@@ -45,6 +48,7 @@ tab_keys = {
     "tab_find": ck("tab_find"),
     "tab_next": ck("tab_next"),
     "tab_prev": ck("tab_prev"),
+    "tab_refresh": ck("tab_refresh"),
 }
 
 other_keys = {
@@ -55,20 +59,16 @@ other_keys = {
     "keys_help": ck("keys_help"),
     "yank_urls": ck("yank_urls"),
     "yank_urls_page": ck("yank_urls_page"),
+    "reload_config": ck("reload_config"),
+    "thumbnails_stats": ck("thumbnails_stats"),
 }
 
 
-def rkt(timeout=500, fallback="") -> str:
-    """Read key with timeout, without raising exception.
-    (No exception if no input -> return fallback key or empty string.)
-    """
-    _rsw = STDSCR.derwin(0, 0)
-    _rsw.timeout(timeout)
-    try:
-        c = str(_rsw.get_wch())
-    except curses.error:  # "no input" etc.
-        c = fallback
-    return c
+def reload():
+    """Re-read key bindings (dicts are updated in place)."""
+    for keys in (bmark_keys, hint_keys, scroll_keys, tab_keys, other_keys):
+        for name in keys:
+            keys[name] = ck(name)
 
 
 def bmark_action(ch: str, fallback: dict):
@@ -118,43 +118,87 @@ def hints(ch: str):
     return True
 
 
-def scroll_grid(redraw: Callable) -> str:
-    """Scroll page grid based on the input key."""
-    c = rkt(100)
-    STDSCR.clear()
-    grid = redraw()
-    if c == scroll_keys.get("scroll_down"):
-        grid.shift_index("down")
-    elif c == scroll_keys.get("scroll_up"):
-        grid.shift_index("up")
-    elif c == scroll_keys.get("scroll_down_page"):
-        grid.shift_index("down", page=True)
-    elif c == scroll_keys.get("scroll_up_page"):
-        grid.shift_index("up", page=True)
-    elif c == scroll_keys.get("scroll_top"):
-        grid.shift_index("top")
-    elif c == scroll_keys.get("scroll_bot"):
-        grid.shift_index("bot")
-    return c
-
-
-def scroll(ch: str, redraw: Callable, redrawall: Callable):
-    """Scroll page, especially handle repeated scroll keys."""
-    if ch in scroll_keys.values():
-        thumbnails.draw_stop()
-        c = rkt(100)
-        curses.unget_wch(ch)
-        # if no next input key after timeout -> scroll once
-        if not c:
-            c = scroll_grid(redraw)
-        else:
-            # if next character is also a scroll key
-            # -> loop in simple redraw without thumbnails
-            while c in scroll_keys.values():
-                c = scroll_grid(redraw)
-        redrawall()
-        return True
-    return False
+def read_key(timeout: int):
+    """Read key with timeout in ms, return None if no input (0 => only already queued input)."""
+    STDSCR.timeout(timeout)
+    try:
+        return STDSCR.get_wch()
+    except curses.error:  # no input
+        return None
+    finally:
+        STDSCR.timeout(-1)
+
+
+def unread_key(key):
+    """Push key back to be read by the next read."""
+    if isinstance(key, int):
+        curses.ungetch(key)
+    else:
+        curses.unget_wch(key)
+
+
+def thumbnails_delay() -> int:
+    """Time in ms without input after scrolling or resizing, after which thumbnails are drawn."""
+    return settings.CURRENT.thumbnails_delay
+
+
+def scroll_dir(key) -> tuple[str, bool]:
+    """Return scroll direction & page flag of the scroll key."""
+    if key == scroll_keys.get("scroll_top"):
+        return "top", False
+    if key == scroll_keys.get("scroll_bot"):
+        return "bot", False
+    page = key in (scroll_keys.get("scroll_down_page"), scroll_keys.get("scroll_up_page"))
+    down = key in (scroll_keys.get("scroll_down"), scroll_keys.get("scroll_down_page"))
+    return "down" if down else "up", page
+
+
+def scroll_grid(grid, keys: list) -> int:
+    """Scroll page grid by the scroll keys folded into one net shift."""
+    index = grid.index()
+    for key in keys:
+        index = grid.shifted_index(index, *scroll_dir(key))
+    return grid.set_index(index)
+
+
+def queued_scroll_keys() -> list:
+    """Return scroll keys which are already queued,
+    the first other key is pushed back (to be handled later).
+    """
+    keys = []
+    while True:
+        key = read_key(0)
+        if key is None:
+            break
+        if key not in scroll_keys.values():
+            unread_key(key)
+            break
+        keys.append(key)
+    return keys
+
+
+def scroll(ch: str, page, redrawall: Callable):
+    """Scroll page at once, repeated scroll keys are coalesced: queued keys are
+    folded into one shift per drawn frame. Thumbnails are drawn when input is idle.
+    """
+    if ch not in scroll_keys.values():
+        return False
+    thumbnails.draw_stop()
+    grid = page.grid or page.draw()
+    keys = [ch]
+    while True:
+        keys.extend(queued_scroll_keys())
+        scroll_grid(grid, keys)
+        grid = page.draw()  # simple redraw without thumbnails
+        key = read_key(thumbnails_delay())
+        if key is None:
+            break
+        if key not in scroll_keys.values():
+            unread_key(key)
+            break
+        keys = [key]
+    redrawall()
+    return True
 
 
 def tabs_action(ch: str, fallback: dict):
@@ -169,18 +213,32 @@ def tabs_action(ch: str, fallback: dict):
         page_dict, _ = tabs.next_tab()
     elif ch == tab_keys.get("tab_prev"):
         page_dict, _ = tabs.prev_tab()
+    elif ch == tab_keys.get("tab_refresh"):
+        prefetch.refresh_all()
+        page_dict = fallback
     else:
         page_dict = fallback
     return page_dict
 
 
+def thumbnails_stats():
+    """Notify about the thumbnails cache usage since the start."""
+    stats = thumbnails.CACHE.stats()
+    size, limit = stats["size"] / 1024 / 1024, thumbnails.cache_size() // 1024 // 1024
+    body = (f"{stats['images']} images, {size:.1f} of {limit} MB\n"
+            f"hits: {stats['hits']}, revalidated: {stats['revalidated']}, "
+            f"downloaded: {stats['downloaded']}, failed: {stats['failed']}")
+    notify(body, "thumbnails cache")
+
+
 def yank_urls(full_page=False):
     """Yank urls of visible boxes or all urls of the page."""
     urls = ""
     if full_page:
         page_dict = tabs.cpdict()  # current page/tab
-        json_data = data.page_data(page_dict)
-        if "url" in json_data["data"][0]:
+        json_data = source.get(page_dict)  # page data from cache if fresh
+        entries = json_data.get("data", [])  # empty if offline & not cached
+        if entries and "url" in entries[0]:
             page_urls = data.get_entries(json_data, "url")
             for url in page_urls:
                 urls += f"{url}\n"
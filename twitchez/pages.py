@@ -3,45 +3,69 @@
 
 from twitchez import HEADER_H
 from twitchez import data
+from twitchez import ratelimit
 from twitchez import render
+from twitchez import settings
+from twitchez import source
 from twitchez import thumbnails
-from twitchez import utils
-from twitchez.utils import strws
+from twitchez.api import CLIENT, NETWORK_ERRORS
+from twitchez.records import Records
 from twitchez.tabs import tab_upd
 
-from pathlib import Path
+from collections import OrderedDict
+from threading import Lock, Thread
+from time import monotonic
+
+# secs before the failed background update of the page is retried (doubled on each next failure)
+RETRY_DELAY = 5
+
+# max number of page models kept in memory (least recently drawn are dropped)
+MAX_MODELS = 8
+
+
+class PageModel:
+    """Page data prepared for drawing, built once per change of the cached page data.
+    Scrolling & redrawing of the page do not read or parse page data again.
+    """
+
+    def __init__(self, generation: int, json_data: dict, thumbnail_paths: dict, thumbnail_urls: dict,
+                 fresh_until: float):
+        self.generation = generation  # of the cached page data
+        self.fresh_until = fresh_until  # monotonic time when page data becomes outdated
+        self.records = Records(json_data["data"])  # raw json data is not kept
+        self.ids = self.records.ids
+        self.thumbnail_paths = thumbnail_paths  # updated in place when thumbnails are downloaded
+        self.thumbnail_urls = thumbnail_urls  # raw urls (templates) to download thumbnails
 
 
 class Pages:
+    # page models by the cache key (least recently used first)
+    models: OrderedDict = OrderedDict()
+    # names of the pages for which data is being updated in the background
+    refreshing: set = set()
+    loading_more: set = set()
+    # names of the pages with new data (not yet drawn)
+    updated: set = set()
+    # page name -> (monotonic time till which background updates are not retried, last delay)
+    backoff: dict = {}
+    # errors of the background updates (except network errors) to raise in the main thread
+    errors: list = []
+    lock = Lock()
 
-    def __init__(self, page_dict: dict, force_redownload=False):
+    def __init__(self, page_dict: dict, force_redownload=False, current=True):
         self.page_dict = page_dict
         self.page_name = page_dict["page_name"]
-        self.cache_file_name = f"{strws(self.page_name)}.json"
         self.force_redownload: bool = force_redownload
-        tab_upd(self.page_name, self.page_dict)  # => update tabs
-
-    def cache_subdirs(self):
-        """Return list of subdirs (to unpack them later as args)."""
-        subdirs = []
-        pd = self.page_dict
-        ptype = pd.get("type", "streams")
-        subdirs.append(ptype)
-        if ptype == "videos":
-            if "user_name" in pd:
-                subdirs.append(strws(pd["user_name"]))
-        if "category" in pd:
-            subdirs.append(strws(pd["category"]))
-        return subdirs
-
-    def cache_path(self) -> Path:
-        return data.cache_file_path(self.cache_file_name, *self.cache_subdirs())
-
-    def update_cache(self) -> Path:
-        return data.update_cache(self.cache_file_name, data.page_data(self.page_dict), *self.cache_subdirs())
+        self.stale = False  # outdated cached data is shown (offline)
+        self.not_cached = False  # offline & page data was never downloaded => empty page
+        if current:
+            tab_upd(self.page_name, self.page_dict)  # => update tabs
+            # page is drawn from scratch => no need to redraw on data updated earlier
+            with self.lock:
+                self.updated.discard(self.page_name)
 
     def read_cache(self) -> dict:
-        return data.read_cache(self.cache_file_name, *self.cache_subdirs())
+        return source.read(self.page_dict)
 
     def time_to_update_cache(self) -> bool:
         """Return True if path mtime > 5 mins from now.
@@ -50,77 +74,197 @@ class Pages:
         if self.force_redownload:
             self.force_redownload = False  # switch off to not redownload on each redraw call
             return True
-        fnf = not Path(self.cache_path()).is_file()  # abbrev: file not found
-        if fnf or utils.secs_since_mtime(self.cache_path()) > 300:
-            return True
-        else:
-            return False
+        model = self.models.get(source.cache_key(self.page_dict))
+        if model and model.generation == source.generation(self.page_dict) and monotonic() < model.fresh_until:
+            return False  # known without asking the cache store
+        return not source.is_fresh(self.page_dict)
+
+    def immutable_thumbnails(self) -> bool:
+        """Return True if thumbnails of the page never change (videos & clips)."""
+        return self.page_dict.get("type", "streams") == "videos"
+
+    def background_update(self) -> bool:
+        """Return True if stale cached page may be shown while it is updated in the background."""
+        return settings.CURRENT.background_update
+
+    def refresh(self):
+        """Download page data and update cache.
+        Thumbnails are downloaded later by the fetch queue (only near the viewport).
+        """
+        source.refresh(self.page_dict)
+
+    def download_first_thumbnails(self, count: int):
+        """Download thumbnails of the first count entries of the cached page data."""
+        if thumbnails.text_mode() or count < 1:
+            return
+        entries = source.read_safe(self.page_dict).get("data", [])[:count]
+        ids = [e['id'] for e in entries]
+        thumbnail_urls_raw = [e['thumbnail_url'] for e in entries]
+        thumbnails.download_thumbnails(ids, thumbnail_urls_raw, self.immutable_thumbnails())
+
+    def thumbnails_fetched(self, paths: dict, visible: bool):
+        """Update thumbnail paths of the page model (called from the download thread).
+        If some of the downloaded thumbnails are visible => mark page as updated.
+        """
+        model = self.models.get(source.cache_key(self.page_dict))
+        if model is not None:
+            model.thumbnail_paths.update(paths)
+        if visible:
+            with self.lock:
+                self.updated.add(self.page_name)
+
+    def run_once(self, target, running: set):
+        """Run target (once at a time per page).
+        When target is finished => mark page as updated.
+        If target failed => it is not retried for the page till the backoff expires,
+        errors except network errors are passed to the main thread (see raise_errors).
+        """
+        with self.lock:
+            if self.page_name in running:
+                return
+            retry_at, _ = self.backoff.get(self.page_name, (0.0, 0))
+            if monotonic() < retry_at:
+                return
+            running.add(self.page_name)
+        try:
+            target()
+            with self.lock:
+                self.updated.add(self.page_name)
+                self.backoff.pop(self.page_name, None)
+        except Exception as e:
+            with self.lock:
+                _, delay = self.backoff.get(self.page_name, (0.0, 0))
+                delay = min(delay * 2 or RETRY_DELAY, source.CACHE_TTL)
+                self.backoff[self.page_name] = (monotonic() + delay, delay)
+                if not isinstance(e, NETWORK_ERRORS):
+                    self.errors.append(e)
+        finally:
+            with self.lock:
+                running.discard(self.page_name)
+
+    def raise_errors(self):
+        """Raise (in the main thread) the error of the background update (e.g. invalid OAuth token)."""
+        with self.lock:
+            if not self.errors:
+                return
+            error = self.errors[0]
+            self.errors.clear()
+        raise error
+
+    def run_in_background_priority(self, target, running: set):
+        """Run target once with background priority of the API requests."""
+        with ratelimit.background():
+            self.run_once(target, running)
 
-    def update_data(self) -> dict:
-        """Update json data & return thumbnail paths."""
-        subdirs = self.cache_subdirs()
+    def in_background(self, target, running: set):
+        """Run target in the background thread (once at a time per page).
+        Requests are speculative (stale data refresh, next page) => made with background priority,
+        so they do not use up the rate limit budget of the user-driven requests.
+        """
+        Thread(target=self.run_in_background_priority, args=(target, running), daemon=True).start()
+
+    def refresh_once(self):
+        """Update page data, if not already being updated."""
+        self.run_once(self.refresh, self.refreshing)
+
+    def refresh_in_background(self):
+        """Update page data in the background thread."""
+        self.in_background(self.refresh, self.refreshing)
+
+    def has_update(self) -> bool:
+        """Return True (once) if new data arrived since the last check."""
+        self.raise_errors()
+        with self.lock:
+            if self.page_name in self.updated:
+                self.updated.discard(self.page_name)
+                return True
+        return False
+
+    def update_data(self) -> PageModel:
+        """Update json data if outdated & return page model.
+        If cached data is stale and background_update is enabled
+        => return cached data at once and update it in the background.
+        If offline => return cached data (self.stale is set to True),
+        empty page model if page is not cached (self.not_cached is set to True).
+        """
+        self.raise_errors()
+        forced = self.force_redownload
+        self.stale = False
+        self.not_cached = False
         if self.time_to_update_cache():
-            self.update_cache()
-            json_data = self.read_cache()
-            ids = data.get_entries(json_data, 'id')
-            thumbnail_urls_raw = data.get_entries(json_data, 'thumbnail_url')
-            thumbnail_paths = thumbnails.download_thumbnails(ids, thumbnail_urls_raw, *subdirs)
-        else:
+            cached = source.is_cached(self.page_dict)
+            if not CLIENT.is_online():
+                self.stale = True  # offline => serve outdated cache
+            elif forced or not cached or not self.background_update():
+                try:
+                    self.refresh()
+                except NETWORK_ERRORS:
+                    self.stale = True  # network is not reachable => serve outdated cache
+            else:
+                self.refresh_in_background()
+        if self.stale and not source.is_cached(self.page_dict):
+            self.not_cached = True
+            return PageModel(source.generation(self.page_dict), {"data": []}, {}, {}, 0.0)
+        return self.model()
+
+    def model(self) -> PageModel:
+        """Return page model, (re)build it only if cached page data was changed."""
+        key = source.cache_key(self.page_dict)
+        generation = source.generation(self.page_dict)
+        model = self.models.get(key)
+        if model is not None and model.generation == generation:
+            self.models.move_to_end(key)
+            return model
+        json_data = self.read_cache()
+        thumbnail_paths = {}
+        thumbnail_urls = {}
+        if not thumbnails.text_mode():
             # do not download thumbnails, find previously downloaded thumbnails paths
-            json_data = self.read_cache()
             ids = data.get_entries(json_data, 'id')
-            thumbnail_paths = thumbnails.find_thumbnails(ids, *subdirs)
-        return thumbnail_paths
+            rawurls = data.get_entries(json_data, 'thumbnail_url')
+            thumbnail_paths = thumbnails.find_thumbnails(ids, rawurls)
+            thumbnail_urls = dict(zip(ids, rawurls))
+        fresh_until = monotonic() + source.CACHE_TTL - source.age(self.page_dict)
+        model = PageModel(generation, json_data, thumbnail_paths, thumbnail_urls, fresh_until)
+        self.models[key] = model
+        self.models.move_to_end(key)
+        while len(self.models) > MAX_MODELS:
+            self.models.popitem(last=False)  # e.g. deleted tabs & old search results
+        return model
+
+    def load_more(self):
+        """Fetch the next page of data by the cursor and append it to the cache."""
+        json_data = self.read_cache()
+        cursor = data.next_cursor(json_data)
+        if not cursor:
+            return
+        next_data = data.page_data(self.page_dict, cursor)
+        new_entries = data.extend_page_data(json_data, next_data)
+        source.append(self.page_dict, new_entries, json_data['pagination'])
+
+    def prefetch_more(self):
+        """Load the next page of data in the background thread."""
+        if not CLIENT.is_online():
+            return
+        self.in_background(self.load_more, self.loading_more)
 
     def grid_func(self):
         """Return grid class object for prepared objects of thumbnails and boxes."""
-        if thumbnails.text_mode():
-            if self.time_to_update_cache():
-                self.update_cache()
-            thumbnail_paths = {}
-        else:
-            thumbnail_paths = self.update_data()
-        json_data = self.read_cache()
-        did = data.create_id_dict(json_data)  # dict with id as the key
-        ids = list(did.keys())
+        model = self.update_data()
         boxes = render.Boxes()
-        grid = render.Grid(ids, self.page_name)
+        grid = render.Grid(model.ids, self.page_name)
+        grid.on_near_end = self.prefetch_more
+        grid.make_box = lambda id, x, y: render.Box.from_record(model.records[id], x, y)
+        grid.version = model.generation
+        if model.thumbnail_paths:
+            # download thumbnails of the visible entries first
+            thumbnails.QUEUE.show(source.cache_key(self.page_dict), self.immutable_thumbnails(), model.ids,
+                                  model.thumbnail_urls, grid.key_start_index, grid.layout.total,
+                                  self.thumbnails_fetched)
         for id, (x, y) in grid.coords.items():
-            d = did[id]
-            title = utils.tryencoding(d["title"])
-            if "creator_name" in d:  # => clips
-                # this is actually not login but name -> we do not need that anyway for clips
-                user_login = d["broadcaster_name"]
-                user_name = d["creator_name"]
-            else:
-                # used for composing stream url
-                user_login = d["user_login"]
-                user_name = d["user_name"]
-            if not user_name:  # if user_name is empty (rare, but such case exist!)
-                user_name = user_login
-            # NOTE: videos DOES NOT HAVE game_name/category!
-            if "game_name" in d:  # => live streams
-                category = d["game_name"]
-            elif "created_at" in d:  # => videos page
-                category = utils.sdate(d["created_at"])
-            elif "published_at" in d:
-                category = utils.sdate(d["published_at"])
-            else:
-                category = ""
-            if "viewer_count" in d:  # => live streams
-                views = d["viewer_count"]
-            elif "view_count" in d:  # => videos page
-                views = d["view_count"]
-            else:
-                views = ""
-            box = render.Box(user_login, user_name, title, category, x, y)
-            if "url" in d:
-                box.url = d["url"]  # videos have specific url
-            if "duration" in d:
-                box.duration = utils.duration(str(d["duration"]))
-            box.viewers = str(views)
-            if thumbnail_paths:
-                box.img_path = thumbnail_paths[id]
-                thumbnails.Thumbnail(id, thumbnail_paths[id], x, y + HEADER_H)
+            box = render.Box.from_record(model.records[id], x, y)
+            if model.thumbnail_paths:
+                box.img_path = model.thumbnail_paths[id]
+                thumbnails.Thumbnail(id, box.img_path, x, y + HEADER_H)
             boxes.add(box)
         return grid
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from twitchez import conf
+from twitchez import ratelimit
+from twitchez import render
+from twitchez import tabs
+from twitchez.api import CLIENT
+from twitchez.pages import Pages
+
+from threading import Thread
+
+import asyncio
+
+# thread of the currently running fan-out
+RUNNING = Thread()
+
+
+def tabs_limit() -> int:
+    """Max number of tabs refreshed concurrently (min: 1)."""
+    return max(1, int(conf.setting("refresh_tabs_limit")))
+
+
+async def refresh_tab(sem: asyncio.Semaphore, page_dict: dict, force: bool, count: int):
+    """Refresh page data & thumbnails of the first count entries of the tab if outdated (or forced)."""
+    async with sem:
+        page = Pages(page_dict, current=False)
+        if not force and not page.time_to_update_cache():
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, refresh_in_background_priority, page, count)
+
+
+def refresh_in_background_priority(page: Pages, count: int):
+    """Refresh page with background priority of the API requests
+    and download thumbnails of the first count entries (first screen of the tab).
+    """
+    with ratelimit.background():
+        page.refresh_once()
+    page.download_first_thumbnails(count)
+
+
+async def refresh_tabs_async(page_dicts: list, force: bool, count: int):
+    """Concurrently refresh tabs, limited by the number of simultaneous refreshes."""
+    sem = asyncio.Semaphore(tabs_limit())
+    tasks = [refresh_tab(sem, page_dict, force, count) for page_dict in page_dicts]
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def refresh_tabs(page_names: list, force=False):
+    """Refresh tabs by names in the background thread."""
+    global RUNNING
+    if not CLIENT.is_online():
+        return
+    # page dicts are read here, not in the background thread
+    page_dicts = [tabs.pdict(pname) for pname in page_names]
+    if not page_dicts:
+        return
+    count = render.screen_capacity()  # number of thumbnails on the first screen of the tab
+    RUNNING = Thread(target=asyncio.run, args=(refresh_tabs_async(page_dicts, force, count),), daemon=True)
+    RUNNING.start()
+
+
+def refresh_all():
+    """Refresh data & thumbnails (first screen) of all opened tabs."""
+    refresh_tabs(tabs.tab_names_ordered(), force=True)
+
+
+def prefetch_neighbours():
+    """Refresh outdated data & thumbnails (first screen) of the tabs next to the current tab.
+    Does nothing if other refresh is still running.
+    """
+    count = int(conf.setting("prefetch_tabs"))
+    if count < 1 or RUNNING.is_alive():
+        return
+    refresh_tabs(tabs.neighbour_tabs(count))
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from contextlib import contextmanager
+from threading import Condition, local
+from time import monotonic, time
+
+# request priorities
+FOREGROUND = 0  # requests for the visible page
+BACKGROUND = 1  # prefetch etc.
+
+# default helix bucket size for the app access token (requests per minute)
+DEFAULT_LIMIT = 800
+PERIOD = 60.0
+
+_priority = local()
+
+
+def priority() -> int:
+    """Return request priority of the current thread."""
+    return getattr(_priority, "value", FOREGROUND)
+
+
+@contextmanager
+def background():
+    """Make all requests of the current thread inside the block with background priority."""
+    prev = priority()
+    _priority.value = BACKGROUND
+    try:
+        yield
+    finally:
+        _priority.value = prev
+
+
+def header_int(headers, name: str, fallback: int) -> int:
+    try:
+        return int(headers.get(name, fallback))
+    except (TypeError, ValueError):
+        return fallback
+
+
+class RateLimiter:
+    """Token bucket scheduler of the helix requests.
+    Tracks the server budget by the Ratelimit-* response headers,
+    lets foreground requests go before the background ones
+    and waits for the bucket reset when the budget is exhausted (e.g. after 429).
+    """
+
+    def __init__(self, limit=DEFAULT_LIMIT, period=PERIOD):
+        self.limit = limit
+        self.period = period
+        self.tokens = float(limit)
+        self.updated = monotonic()
+        self.reset_at = 0.0  # monotonic time of the bucket reset (if exhausted)
+        self.waiting = [0, 0]  # number of waiting requests per priority
+        self.cond = Condition()
+
+    def refill(self):
+        """Refill tokens by the elapsed time (bucket refills continuously)."""
+        now = monotonic()
+        if self.reset_at and now >= self.reset_at:
+            self.tokens = float(self.limit)
+            self.reset_at = 0.0
+        elif not self.reset_at:
+            self.tokens = min(float(self.limit), self.tokens + (now - self.updated) * self.limit / self.period)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Return time in secs until at least one token will be available."""
+        if self.reset_at:
+            return max(0.01, self.reset_at - monotonic())
+        return max(0.01, (1 - self.tokens) * self.period / self.limit)
+
+    def acquire(self, prio=FOREGROUND):
+        """Block until request with the priority can be made & take one token."""
+        with self.cond:
+            self.waiting[prio] += 1
+            try:
+                while True:
+                    self.refill()
+                    # background requests yield to the waiting foreground requests
+                    ahead = sum(self.waiting[:prio])
+                    if self.tokens >= 1 and not ahead:
+                        self.tokens -= 1
+                        return
+                    if self.tokens >= 1:
+                        self.cond.wait(0.05)
+                    else:
+                        self.cond.wait(self.wait_time())
+            finally:
+                self.waiting[prio] -= 1
+                self.cond.notify_all()
+
+    def update(self, headers):
+        """Sync the bucket with the server budget from the response headers."""
+        if "Ratelimit-Remaining" not in headers:
+            return
+        with self.cond:
+            self.limit = header_int(headers, "Ratelimit-Limit", self.limit)
+            remaining = header_int(headers, "Ratelimit-Remaining", int(self.tokens))
+            self.tokens = float(remaining)
+            self.updated = monotonic()
+            if self.tokens < 1:
+                self.exhausted(headers)
+            self.cond.notify_all()
+
+    def exhausted(self, headers, backoff=1.0):
+        """Wait for the bucket reset (Ratelimit-Reset epoch secs) or backoff secs."""
+        reset = header_int(headers, "Ratelimit-Reset", 0)
+        delay = reset - time() if reset else backoff
+        delay = min(max(delay, backoff), self.period)
+        self.tokens = 0.0
+        self.reset_at = monotonic() + delay
+
+    def backoff(self, headers, attempt=0):
+        """Handle 429 response: empty the bucket till the reset (exponential backoff fallback)."""
+        with self.cond:
+            self.exhausted(headers, backoff=2.0 ** attempt)
+            self.cond.notify_all()
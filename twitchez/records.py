@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from twitchez import utils
+
+from sys import intern
+
+# displayed & actionable fields of the page entry
+FIELDS = ("id", "login", "name", "title", "category", "viewers", "duration", "url")
+
+
+class Record:
+    """Compact page entry with preformatted fields (id is also the thumbnail key)."""
+    __slots__ = FIELDS
+
+    def __init__(self, id, login, name, title, category, viewers, duration, url):
+        self.id = id
+        self.login = login  # for composing url & opening chat
+        self.name = name
+        self.title = title
+        self.category = category
+        self.viewers = viewers
+        self.duration = duration
+        self.url = url
+
+
+def fields(d: dict) -> tuple:
+    """Return tuple of the record fields from the helix page data entry."""
+    title = utils.tryencoding(d["title"])
+    if "creator_name" in d:  # => clips
+        # this is actually not login but name -> we do not need that anyway for clips
+        login = d["broadcaster_name"]
+        name = d["creator_name"]
+    else:
+        # used for composing stream url
+        login = d["user_login"]
+        name = d["user_name"]
+    if not name:  # if user_name is empty (rare, but such case exist!)
+        name = login
+    # NOTE: videos DOES NOT HAVE game_name/category!
+    if "game_name" in d:  # => live streams
+        category = d["game_name"]
+    elif "created_at" in d:  # => videos page
+        category = utils.sdate(d["created_at"])
+    elif "published_at" in d:
+        category = utils.sdate(d["published_at"])
+    else:
+        category = ""
+    if "viewer_count" in d:  # => live streams
+        views = d["viewer_count"]
+    elif "view_count" in d:  # => videos page
+        views = d["view_count"]
+    else:
+        views = ""
+    return (
+        d["id"],
+        intern(login),
+        intern(name),
+        utils.strclean(title),
+        intern(category),  # the same for many entries
+        str(views),
+        utils.duration(str(d["duration"])) if "duration" in d else "",
+        # videos have specific url
+        d.get("url", f"https://www.twitch.tv/{login}"),
+    )
+
+
+class Records:
+    """Records of the page stored as column arrays (one list per field),
+    entries are not kept as separate objects => memory stays flat for long pages.
+    Record objects are created on access (only for the drawn entries).
+    """
+    __slots__ = ("columns", "pos")
+
+    def __init__(self, entries=()):
+        self.columns = tuple([] for _ in FIELDS)
+        self.pos = {}  # id -> index in the columns
+        self.extend(entries)
+
+    def extend(self, entries):
+        """Add helix page data entries, already added ids are skipped."""
+        for d in entries:
+            if d["id"] in self.pos:
+                continue
+            self.pos[d["id"]] = len(self.pos)
+            for column, value in zip(self.columns, fields(d)):
+                column.append(value)
+
+    @property
+    def ids(self) -> list:
+        """Ids in the page order."""
+        return self.columns[0]
+
+    def __len__(self) -> int:
+        return len(self.pos)
+
+    def __contains__(self, id) -> bool:
+        return id in self.pos
+
+    def __getitem__(self, id) -> Record:
+        i = self.pos[id]
+        return Record(*(column[i] for column in self.columns))
@@ -3,6 +3,7 @@
 
 from twitchez import HEADER_H
 from twitchez import STDSCR
+from twitchez import bandwidth
 from twitchez import conf
 from twitchez import hints
 from twitchez import open_chat
@@ -13,14 +14,19 @@ from twitchez.clip import clip
 from twitchez.tabs import tab_names_ordered
 from twitchez.thumbnails import container_size
 
+from collections.abc import Callable
+from functools import lru_cache
 from itertools import islice
 from threading import Thread
-from typing import TypeVar
+from typing import NamedTuple, TypeVar
 import curses
 
 
 SelfBoxes = TypeVar("SelfBoxes", bound="Boxes")
 
+# max height of the body pad in lines
+PAD_LINES = 1000
+
 
 class Boxes:
     """Operate on list of Boxes"""
@@ -31,16 +37,15 @@ class Boxes:
         """Add box object to list."""
         self.boxlist.append(obj)
 
-    def draw(self, parent, grid, fulltitle=False):
-        """Draw boxes."""
+    def draw(self, grid, fulltitle=False):
+        """Draw boxes (only changed ones are redrawn)."""
         self.drawn_boxes.clear()
-        stop = len(grid.coordinates())
+        stop = len(grid.coords)
         for box in islice(self.boxlist, stop):
             if fulltitle:
                 box.fulltitle = True
-            box.draw(parent)
             self.drawn_boxes.append(box)
-        parent.refresh()
+        RENDERER.draw_body(grid, fulltitle)
         self.boxlist.clear()
 
     def show_hints_boxes(self):
@@ -50,6 +55,7 @@ class Boxes:
         for box, hint in zip(boxes, hseq):
             box.hint = hint
             box.show_hint()
+        curses.doupdate()  # show all hints at once
         return hints.find_seq(hseq)
 
     def show_boxes_hint(self: SelfBoxes) -> tuple[SelfBoxes, str]:
@@ -86,13 +92,15 @@ class Boxes:
 
 class Box:
     """Box with info about the stream/video inside the Grid."""
-    w, h = container_size()
-    last = h - 2  # last line of the box
+    __slots__ = ("user_login", "user_name", "title", "category", "x", "y", "w", "h", "last",
+                 "url", "hint", "img_path", "viewers", "duration", "fulltitle")
 
-    def __init__(self, user_login, user_name, title, category, x, y):
+    def __init__(self, user_login, user_name, title, category, x, y, clean=True):
+        self.w, self.h = container_size()
+        self.last = self.h - 2  # last line of the box
         self.user_login = user_login  # for composing url
         self.user_name = user_name
-        self.title = utils.strclean(title)
+        self.title = utils.strclean(title) if clean else title
         self.category = category
         self.x = x
         self.y = y
@@ -103,9 +111,21 @@ class Box:
         self.duration = ""
         self.fulltitle = False
 
-    def draw(self, parent):
-        """Draw Box."""
-        win = parent.derwin(self.h, self.w, self.y, self.x)
+    @classmethod
+    def from_record(cls, record, x, y):
+        """Create Box from the page record (title is already cleaned in records)."""
+        box = cls(record.login, record.name, record.title, record.category, x, y, clean=False)
+        box.url = record.url
+        box.viewers = record.viewers
+        box.duration = record.duration
+        return box
+
+    def state(self) -> tuple:
+        """Return everything which is drawn inside the box (to detect changes)."""
+        return self.user_name, self.title, self.category, self.viewers, self.duration, self.fulltitle
+
+    def draw(self, win):
+        """Draw Box inside its window."""
         win.addnstr(self.last, 0, f"{self.category}", self.w)
         if self.duration:
             duration = f"[{self.duration}]"
@@ -118,15 +138,14 @@ class Box:
             viewers = f" {self.viewers}"
             rside = self.w - len(viewers)
             win.addstr(self.last, rside, viewers, curses.A_BOLD)
+        title = utils.layout_title(self.title, self.w, self.fulltitle)
         if self.fulltitle:
             max_len = int(self.w * 3)  # 3 box widths (lines)
-            title = utils.word_wrap_title(self.title, self.w, max_len)
             try:
                 win.addnstr(self.last - 2, 0, title, max_len)
             except Exception:
                 win.box()
         else:
-            title = utils.strtoolong(self.title, self.w)
             win.addnstr(self.last - 2, 0, title, self.w)
 
     def show_hint(self):
@@ -142,42 +161,86 @@ class Box:
             lh = len(hint)
             win = curses.newwin(1, lh + 1, self.y + self.h - 1, self.x + self.w - lh)
             win.addstr(hint, curses.color_pair(1))
-            win.refresh()
+            win.noutrefresh()
+
+
+class Layout(NamedTuple):
+    """Grid layout in the body area."""
+    cols: int  # how many boxes can fit in
+    rows: int
+    total: int
+    sc: int  # offsets for more even spacing from both sides
+    sr: int
+    start: int  # index of the first visible element (of the first column)
+    coords: tuple  # (x, y) of the visible elements
+
+
+def position(lt: Layout, w: int, h: int, index: int, base_row=0) -> tuple[int, int]:
+    """Return tuple(X, Y) of the element by its index, Y is counted from the grid row base_row."""
+    row, col = divmod(index, lt.cols)
+    if lt.cols > 2:
+        x = lt.sc * 2 + col * (lt.sc * 2 + w)
+    else:
+        x = lt.sc + col * (lt.sc + w)
+    y = lt.sr + (row - base_row) * (lt.sr + h)
+    return x, y
+
+
+@lru_cache(maxsize=256)
+def layout(area_rows: int, area_cols: int, w: int, h: int, count: int, start: int) -> Layout:
+    """Lay out count elements of w*h size in the body area from the start index.
+    Pure function => resize bursts & scrolling back & forth reuse computed layouts.
+    """
+    cols = area_cols // w
+    rows = area_rows // h
+    total = cols * rows
+    if cols < 1:
+        return Layout(cols, rows, total, 0, 0, 0, ())
+    # even spacing between grid elements
+    scols = int(area_cols - w * cols) // cols
+    srows = int(area_rows - h * rows) // rows if rows > 0 else 0
+    start -= start % cols
+    lt = Layout(cols, rows, total, scols // 2, srows // 2, start, ())
+    end = min(start + total, count)  # for scrolling
+    coords = tuple(position(lt, w, h, i, start // cols) for i in range(start, end))
+    return lt._replace(coords=coords)
+
+
+def screen_capacity() -> int:
+    """Max number of boxes on one screen of the grid."""
+    ba = BodyArea()
+    w, h = container_size()
+    return layout(ba.rows, ba.cols, w, h, 0, 0).total
 
 
 class Grid:
     """Grid of boxes inside the Window."""
-    w, h = container_size()
 
     def __init__(self, key_list: list, page_name: str):
+        self.w, self.h = container_size()
         self.key_list = key_list
         self.page_name = page_name
         self.__ba = BodyArea()
         self.area_cols = self.__ba.cols
         self.area_rows = self.__ba.rows
         self.key_start_index = self.index()
+        # called when scrolled near the end of the key_list (to load more)
+        self.on_near_end: Callable = lambda: None
+        # boxes for the elements of the key_list (set by the page), version of the key_list
+        self.make_box: Callable = lambda key, x, y: None
+        self.version = 0
+        if self.key_start_index >= len(self.key_list):
+            # fix: index out of the key_list (list of the page became shorter)
+            self.key_start_index = self.index("0")
+        self.layout = layout(self.area_rows, self.area_cols, self.w, self.h,
+                             len(self.key_list), self.key_start_index)
+        # grid starts from the first column (e.g. number of columns changed)
+        self.key_start_index = self.layout.start
         self.coords = self.coordinates()
 
     def capacity(self) -> tuple[int, int, int]:
         """Return - how many boxes can fit in: (cols, rows, total)."""
-        cols = self.area_cols // self.w
-        rows = self.area_rows // self.h
-        total = cols * rows
-        return cols, rows, total
-
-    def spacing(self, cols, rows) -> tuple[int, int]:
-        """Calculate even spacing between grid elements.
-        returns spacing: cols, rows.
-        """
-        if cols < 1:
-            c = 0
-        else:
-            c = int(self.area_cols - self.w * cols) // cols
-        if rows < 1:
-            r = 0
-        else:
-            r = int(self.area_rows - self.h * rows) // rows
-        return c, r
+        return self.layout.cols, self.layout.rows, self.layout.total
 
     def index(self, start_index="") -> int:
         """Set/Get initial grid index."""
@@ -191,65 +254,58 @@ class Grid:
                 conf.tmp_set("grid_index", index, self.page_name)
         return index
 
-    def shift_index(self, dir="down", page=False) -> int:
-        """Shift value of the key start index."""
+    def end_index(self) -> int:
+        """Return start index of the last screen of the grid."""
         cols, _, total = self.capacity()
         elems_total = len(self.key_list)
+        if cols < 1 or elems_total <= total:
+            return 0
         remainder = elems_total % cols
         if remainder == 0:
-            end_of_page = elems_total - total
-        else:
-            end_of_page = elems_total - total - remainder + cols
-        if elems_total <= total:
-            start_index = 0
+            return elems_total - total
+        return elems_total - total - remainder + cols
+
+    def shifted_index(self, index: int, dir="down", page=False) -> int:
+        """Return index shifted from the index in the direction (limited by the grid ends)."""
+        cols, _, total = self.capacity()
+        if dir == "top":
+            index = 0
+        elif dir == "bot":
+            index = self.end_index()
+        elif page:
+            index += total if dir == "down" else -total
         else:
-            grid_index = self.index()
-            if dir == "top":
-                start_index = 0
-            elif dir == "bot":
-                start_index = end_of_page
-            elif page:
-                if dir == "down":
-                    start_index = grid_index + total
-                else:
-                    start_index = grid_index - total
-            else:
-                if dir == "down":
-                    start_index = grid_index + cols
-                else:
-                    start_index = grid_index - cols
-            if start_index < 0:
-                start_index = 0
-            elif start_index > end_of_page:
-                start_index = end_of_page
+            index += cols if dir == "down" else -cols
+        return min(max(index, 0), self.end_index())
+
+    def set_index(self, start_index: int) -> int:
+        """Set key start index (used by the next draw)."""
+        _, _, total = self.capacity()
+        # next screen reaches the end of the list => load more in advance
+        if start_index + total * 2 >= len(self.key_list):
+            self.on_near_end()
         self.index(str(start_index))
         return start_index
 
+    def offsets(self) -> tuple[int, int]:
+        """Return offsets for more even spacing from both sides: x, y."""
+        return self.layout.sc, self.layout.sr
+
+    def row_height(self) -> int:
+        """Height of the grid row in lines (box height + spacing between rows)."""
+        _, sr = self.offsets()
+        return self.h + sr
+
+    def position(self, index: int, base_row=0) -> tuple[int, int]:
+        """Return tuple(X, Y) of the key_list element by its index,
+        Y is counted from the grid row base_row.
+        """
+        return position(self.layout, self.w, self.h, index, base_row)
+
     def coordinates(self) -> dict:
         """Return dict with: tuple(X, Y) values where each key_list element is the key."""
-        initial_x, initial_y = 0, 0
-        cols, rows, total = self.capacity()
-        total += self.key_start_index  # for scrolling
-        scols, srows = self.spacing(cols, rows)
-        # for more even spacing from both sides
-        sc = scols // 2
-        sr = srows // 2
-        x = initial_x + sc
-        y = initial_y + sr
-        current_col = 1
-        coordinates = {}
-        for key in islice(self.key_list, self.key_start_index, total):
-            if cols > 2:
-                x += sc
-            coordinates[key] = (x, y)
-            if current_col < cols:
-                current_col += 1
-                x += sc + self.w
-            else:
-                current_col = 1
-                x = initial_x + sc
-                y += sr + self.h
-        return coordinates
+        keys = islice(self.key_list, self.layout.start, self.layout.start + len(self.layout.coords))
+        return dict(zip(keys, self.layout.coords))
 
 
 class Page:
@@ -259,7 +315,9 @@ class Page:
         self.pages_class = pages.Pages(page_dict, force_redownload)
         self.page_name = self.pages_class.page_name
         self.grid_func = self.pages_class.grid_func
+        self.has_update = self.pages_class.has_update
         self.loaded = False
+        self.grid = None  # grid of the last draw
 
     def loading(self):
         """Simple animation to show that something is being done (Page loading).
@@ -295,7 +353,7 @@ class Page:
         try:
             win = curses.newwin(1, 1, 0, 0)
         except Exception:
-            return
+            return None
 
         try:
             if ANIMATION:
@@ -307,10 +365,10 @@ class Page:
                 win.erase()
             else:
                 # leave a static indicator about not yet finished loading
-                # it probably will be cleared by some clear of the screen
-                # so we do not bother much about clearing of the static indicator :)
+                # it is erased by the draw() when the page is drawn
                 win.insstr("*")
             win.refresh()
+        return win
 
     def draw_header(self):
         """Draw page header."""
@@ -319,9 +377,15 @@ class Page:
         separator = "|"  # separator between tabs
         between_tabs = indent_between + separator + indent_between
         logo = "[twitchez]"
+        if self.pages_class.not_cached:
+            logo = "[offline: not cached] " + logo  # empty page (offline)
+        elif self.pages_class.stale:
+            logo = "[stale] " + logo  # outdated cached data is shown (offline)
+        indicator = bandwidth.METER.indicator()
+        if indicator:
+            logo = indicator + " " + logo  # thumbnails download speed & lowered quality
         c_page = self.page_name  # current page name
         _, w = STDSCR.getmaxyx()
-        head = STDSCR.derwin(HEADER_H - 1, w, 0, 0)
         other_tabs = ""
         # tab order where current page is always first in list (to look as carousel)
         taborder = []
@@ -334,6 +398,9 @@ class Page:
                 continue  # skip current tab
             # indent_between with separator for each additional tab page
             other_tabs += between_tabs + tab
+        head = RENDERER.head_window((c_page, other_tabs, logo, w))
+        if head is None:
+            return  # header is not changed
         icp = indent + len(c_page)  # width of current page with indent
         all_tabs = indent + len(c_page + other_tabs)
         if w > all_tabs:  # if we can fit all tabs
@@ -353,25 +420,27 @@ class Page:
                 wolimit = w - icp - 1
                 other_tabs = other_tabs[:wolimit - 1] + ">"
                 head.addnstr(0, icp, other_tabs, wolimit)
-        head.refresh()
-        return head
+        head.noutrefresh()
 
     def draw_body(self, grid, fulltitle=False):
         """Draw page body."""
-        body = BodyArea().window()
         if fulltitle:
-            Boxes().draw(body, grid, fulltitle)
+            Boxes().draw(grid, fulltitle)
         else:
-            Boxes().draw(body, grid)
-        return body
+            Boxes().draw(grid)
 
     def draw(self, fulltitle=False):
-        """return grid and draw full page."""
-        self.loading()
+        """return grid and draw full page (changes are flushed to the terminal at once)."""
+        indicator = None if self.loaded else self.loading()
         grid = self.grid_func()
         self.draw_body(grid, fulltitle)
         self.draw_header()
+        if indicator is not None:
+            indicator.erase()
+            indicator.noutrefresh()
+        curses.doupdate()
         self.loaded = True  # finish animation of loading if not yet ended
+        self.grid = grid
         return grid
 
 
@@ -382,6 +451,150 @@ class BodyArea:
         self.rows, self.cols = STDSCR.getmaxyx()
         self.rows = self.rows - HEADER_H
 
-    def window(self):
-        """Create & return body window."""
-        return STDSCR.derwin(self.rows, self.cols, HEADER_H, 0)
+    def pad(self, lines: int):
+        """Create & return body pad (of the body area width)."""
+        return curses.newpad(max(lines, 1), max(self.cols, 1))
+
+
+class Renderer:
+    """Curses windows of the page reused between draws.
+    Body is a pad with laid-out grid rows, which are drawn lazily in chunks
+    (rows of one screen) around the visible rows => scrolling just moves the pad viewport.
+    Box windows are kept per element of the grid, only boxes whose content changed are redrawn,
+    all changes are flushed to the terminal once per frame (by curses.doupdate).
+    """
+
+    def __init__(self):
+        self.size = (0, 0)
+        self.head = None
+        self.head_state = None
+        self.pad = None
+        self.pad_rows = 0  # number of the grid rows held by the pad
+        self.base_row = 0  # grid row at the top of the pad
+        self.geometry = None  # grid geometry of the pad
+        self.version = None  # page, data version & mode of the drawn boxes
+        self.chunks = set()  # drawn chunks of the grid rows
+        self.slots = {}  # per element index of the grid: [window, geometry, drawn state]
+        self.keys = None  # window with the last pressed key chars (drawn over the body)
+
+    def reset(self):
+        """Drop all windows (terminal resized)."""
+        self.keys = None
+        self.head = None
+        self.head_state = None
+        self.pad = None
+        self.geometry = None
+        self.version = None
+        self.chunks.clear()
+        self.slots.clear()
+        STDSCR.erase()  # erase without forcing full repaint of the terminal
+        STDSCR.noutrefresh()  # => stdscr will not be drawn over the body pad
+
+    def invalidate(self):
+        """Redraw everything on the next draw (e.g. something was drawn over the page),
+        the terminal itself is updated only where the cells actually differ.
+        """
+        self.head_state = None
+        if self.pad is not None:
+            self.pad.touchwin()
+        # wipe overlays drawn into stdscr (e.g. rows between header & body)
+        STDSCR.erase()
+        STDSCR.noutrefresh()
+
+    def check_size(self):
+        size = STDSCR.getmaxyx()
+        if size != self.size:
+            self.size = size
+            self.reset()
+
+    def head_window(self, state):
+        """Return erased header window ready for drawing or None if header state is not changed."""
+        self.check_size()
+        if state == self.head_state:
+            return None
+        if self.head is None:
+            _, w = self.size
+            self.head = STDSCR.derwin(HEADER_H - 1, w, 0, 0)
+        self.head_state = state
+        self.head.erase()
+        return self.head
+
+    def keys_window(self):
+        """Return erased window at the bottom-right corner for the last pressed key chars."""
+        self.check_size()
+        if self.keys is None:
+            h, w = self.size
+            self.keys = STDSCR.derwin(1, 8, h - 1, w - 8)
+        self.keys.erase()
+        return self.keys
+
+    def rebase(self, base_row: int):
+        """Set the grid row at the top of the pad (pad holds limited number of rows)."""
+        self.base_row = base_row
+        self.chunks.clear()
+        self.slots.clear()
+        self.pad.erase()
+
+    def draw_chunk(self, grid: Grid, chunk: int, screen_rows: int, fulltitle: bool):
+        """Draw boxes of the grid rows of the chunk, skip unchanged boxes."""
+        cols, _, _ = grid.capacity()
+        start = chunk * screen_rows * cols
+        end = min(start + screen_rows * cols, len(grid.key_list))
+        for i in range(start, end):
+            x, y = grid.position(i, self.base_row)
+            box = grid.make_box(grid.key_list[i], x, y)
+            if box is None:
+                continue
+            box.fulltitle = fulltitle
+            state = box.state()
+            slot = self.slots.get(i)
+            if slot is None:
+                slot = self.slots[i] = [self.pad.subpad(box.h, box.w, box.y, box.x), None]
+            if slot[1] == state:
+                continue  # box is not changed
+            slot[0].erase()
+            box.draw(slot[0])
+            slot[1] = state
+
+    def draw_body(self, grid: Grid, fulltitle=False):
+        """Draw grid rows near the visible ones (if not yet drawn) & show visible rows."""
+        self.check_size()
+        area = BodyArea()
+        cols, screen_rows, _ = grid.capacity()
+        if cols < 1 or screen_rows < 1 or area.rows < 1:
+            return
+        row_h = grid.row_height()
+        geometry = (cols, screen_rows, row_h, grid.offsets(), grid.w, grid.h)
+        if geometry != self.geometry:  # new layout => new pad
+            self.geometry = geometry
+            # pad holds whole chunks: current, previous & next screens at least
+            self.pad_rows = max(4, PAD_LINES // row_h // screen_rows) * screen_rows
+            self.pad = area.pad(self.pad_rows * row_h + area.rows)
+            self.version = None
+            self.rebase(0)
+        version = (grid.page_name, grid.version, fulltitle)
+        if version != self.version:
+            # boxes are compared with the drawn ones => only changed boxes are redrawn
+            self.version = version
+            self.chunks.clear()
+            for i in [i for i in self.slots if i >= len(grid.key_list)]:
+                self.slots.pop(i)[0].erase()
+        row = grid.key_start_index // cols  # first visible row
+        if row < self.base_row or row + screen_rows * 2 > self.base_row + self.pad_rows:
+            self.rebase(max(0, row // screen_rows - 1) * screen_rows)
+        # chunks of the previous, current & next screens
+        total_rows = -(-len(grid.key_list) // cols)
+        first = max(row - screen_rows, self.base_row) // screen_rows
+        last = min(row + screen_rows * 2, total_rows)
+        for chunk in range(first, -(-last // screen_rows)):
+            if chunk not in self.chunks:
+                self.draw_chunk(grid, chunk, screen_rows, fulltitle)
+                self.chunks.add(chunk)
+        top = (row - self.base_row) * row_h
+        self.pad.noutrefresh(top, 0, HEADER_H, 0, HEADER_H + area.rows - 1, area.cols - 1)
+        if self.keys is not None:
+            self.keys.touchwin()  # keep it over the body
+            self.keys.noutrefresh()
+
+
+RENDERER: Renderer = Renderer()
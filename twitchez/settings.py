@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from twitchez import command
+from twitchez import conf
+
+from os.path import getmtime
+from shutil import which
+from typing import NamedTuple
+
+import fcntl
+import struct
+import sys
+import termios
+
+# aspect ratio of the twitch thumbnails (16:9)
+ASPECT_W, ASPECT_H = 16, 9
+# width of the requested thumbnails is rounded up to multiple of (fewer cached sizes)
+PIXEL_STEP = 16
+
+
+class Settings(NamedTuple):
+    """Immutable snapshot of the settings used in hot paths with precomputed geometry."""
+    text_mode: int
+    rdiv: int
+    box_size: tuple[int, int]  # (width, height) of the box in the grid
+    thumbnail_size: tuple[int, int]  # (width, height) of the thumbnail in cells
+    thumbnail_resolution: tuple[int, int]  # (width, height) in pixels
+    background_update: bool
+    thumbnails_delay: int
+    adaptive_thumbnails: bool
+    offline_mode: bool
+    emoji_cells: int  # visible length of one emoji in terminal cells
+
+
+def has_ueberzug() -> bool:
+    """Return True if ueberzug executable is at PATH or provided via user cmd."""
+    found = bool(which("ueberzugpp")) | bool(which("ueberzug"))
+    # also check user cmd in case executable provided via full path
+    found |= command.conf_cmd_check("ueberzug_cmd")[0]
+    return found
+
+
+def text_mode() -> int:
+    """Text mode: 0 => thumbnails mode (min: 0, max: 3).
+    [1-3] => do not do anything with thumbnails do not even download them!
+    The higher the value, the more rows of cells there will be in the grid.
+    """
+    tm = int(conf.setting("text_mode"))
+    if tm < 0:
+        tm = 0
+    elif tm > 3:
+        tm = 3
+    # explicit text mode if ueberzug not found (optional dependency)
+    if not has_ueberzug() and tm < 1:
+        tm = 1
+    return tm
+
+
+def rdiv() -> int:
+    """Thumbnail resolution divisor (min: 2, max: 10)."""
+    div = 1 + int(conf.setting("grid_size"))
+    if div < 2:
+        div = 2
+    elif div > 10:
+        div = 10
+    return div
+
+
+def container_size(div: int, tm: int, thumbnail=False) -> tuple[int, int]:
+    """Return tuple: (width, height) - based on divisor key in table.
+    Selected values are close as possible to the real resolution of the thumbnails.
+    Except couple values where visual result more appropriate: with (2,3,4) as divisor.
+    """
+    table = {
+        10: (24, 7),
+        9: (27, 8),
+        8: (30, 9),
+        7: (35, 10),
+        6: (40, 11),
+        5: (48, 13),
+        4: (56, 15),
+        3: (76, 20),
+        2: (90, 24),
+    }
+    # use fallback key if div key not found
+    _def_fix: tuple = (40, 11)  # fix: None is not assignable
+    w, h = tuple(table.get(div, table.get(6, _def_fix)))
+    # width/height modifier for perfect placement of thumbnails in the grid (very font dependent)
+    w += int(conf.setting("wmod"))
+    h += int(conf.setting("hmod"))
+    if tm:
+        return w, h - tm
+    elif thumbnail:
+        return w, h
+    else:
+        NLC = 3  # num of content lines in the box
+        return w, h + NLC
+
+
+def thumbnail_resolution(div: int) -> tuple[int, int]:
+    """Return tuple: (width, height) - based on divisor key in table.
+    really simple:  divisor = 10
+    (1920, 1080) / 10 = (192, 108)
+    The only values that don't match the actual result: divisor=2.
+    """
+    table = {
+        10: (192, 108),
+        9: (213, 120),
+        8: (240, 135),
+        7: (274, 154),
+        6: (320, 180),
+        5: (384, 216),
+        4: (480, 270),
+        3: (640, 360),
+        2: (720, 405),  # actual (960, 540) is overkill!
+    }
+    # use fallback key if div key not found
+    _def_fix: tuple = (320, 180)  # fix: None is not assignable
+    return table.get(div, table.get(6, _def_fix))
+
+
+def cell_pixels() -> tuple[int, int]:
+    """Return (width, height) of the terminal cell in pixels by TIOCGWINSZ.
+    (0, 0) if terminal does not report its size in pixels.
+    """
+    try:
+        winsize = fcntl.ioctl(sys.stdout.fileno(), termios.TIOCGWINSZ, bytes(8))
+        rows, cols, xpixel, ypixel = struct.unpack("HHHH", winsize)
+    except (OSError, ValueError, AttributeError):  # not a terminal
+        return 0, 0
+    if not (rows and cols and xpixel and ypixel):
+        return 0, 0
+    return xpixel // cols, ypixel // rows
+
+
+def exact_resolution(thumbnail_size: tuple[int, int]) -> tuple[int, int]:
+    """Return tuple: (width, height) - pixel size of the thumbnail which fits the thumbnail box
+    (thumbnail_size in cells) exactly, (0, 0) if size of the terminal cell in pixels is unknown.
+    """
+    cell_w, cell_h = cell_pixels()
+    if not cell_w or not cell_h:
+        return 0, 0
+    box_w, box_h = thumbnail_size[0] * cell_w, thumbnail_size[1] * cell_h
+    # fit (contain) 16:9 image to the box
+    width = min(box_w, box_h * ASPECT_W // ASPECT_H)
+    width = min(-(-width // PIXEL_STEP) * PIXEL_STEP, 1920)
+    if width <= 0:
+        return 0, 0
+    return width, round(width * ASPECT_H / ASPECT_W)
+
+
+def snapshot() -> Settings:
+    """Read settings & compute derived values."""
+    tm = text_mode()
+    div = rdiv()
+    thumbnail_size = container_size(div, tm, thumbnail=True)
+    resolution = exact_resolution(thumbnail_size)
+    if not all(resolution):
+        resolution = thumbnail_resolution(div)  # fallback to the table
+    return Settings(
+        text_mode=tm,
+        rdiv=div,
+        box_size=container_size(div, tm),
+        thumbnail_size=thumbnail_size,
+        thumbnail_resolution=resolution,
+        background_update=bool(int(conf.setting("background_update"))),
+        thumbnails_delay=int(conf.setting("thumbnails_delay")),
+        adaptive_thumbnails=bool(int(conf.setting("adaptive_thumbnails"))),
+        offline_mode=bool(int(conf.setting("offline_mode"))),
+        emoji_cells=max(int(conf.setting("emoji_cells")), 1),
+    )
+
+
+def conf_mtimes() -> tuple:
+    """Return mtimes of the user config files (0 if file does not exist)."""
+    mtimes = []
+    for path in (conf.user_conf, conf.user_keys):
+        try:
+            mtimes.append(getmtime(path))
+        except OSError:
+            mtimes.append(0)
+    return tuple(mtimes)
+
+
+CURRENT: Settings = snapshot()
+MTIMES: tuple = conf_mtimes()
+
+
+def reload() -> Settings:
+    """Re-read config files & swap the settings snapshot (and key bindings)."""
+    global CURRENT, MTIMES
+    MTIMES = conf_mtimes()
+    conf.reload()
+    CURRENT = snapshot()  # swapped at once => readers see old or new snapshot
+    return CURRENT
+
+
+def resized() -> Settings:
+    """Update thumbnail resolution after terminal resize (e.g. font size was changed)."""
+    global CURRENT
+    resolution = exact_resolution(CURRENT.thumbnail_size)
+    if all(resolution) and resolution != CURRENT.thumbnail_resolution:
+        CURRENT = CURRENT._replace(thumbnail_resolution=resolution)
+    return CURRENT
+
+
+def changed() -> bool:
+    """Return True if user config files were changed since the last (re)load."""
+    return conf_mtimes() != MTIMES
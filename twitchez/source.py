@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from twitchez import data
+from twitchez.api import CLIENT, NETWORK_ERRORS, SingleFlight
+from twitchez.store import STORE
+from twitchez.utils import strws
+
+from collections.abc import Callable
+
+# max age of the cached page data in secs (default twitch API update time)
+CACHE_TTL = 300
+
+# coalesce concurrent refreshes of the same page
+FLIGHT: SingleFlight = SingleFlight()
+
+# number of changes of the cached page data (by the cache key) since the start
+GENERATIONS: dict[str, int] = {}
+
+
+def cache_subdirs(page_dict: dict) -> list:
+    """Return list of subdirs (to unpack them later as args)."""
+    subdirs = []
+    pd = page_dict
+    ptype = pd.get("type", "streams")
+    subdirs.append(ptype)
+    if ptype == "videos":
+        if "user_name" in pd:
+            subdirs.append(strws(pd["user_name"]))
+    if "category" in pd:
+        subdirs.append(strws(pd["category"]))
+    return subdirs
+
+
+def cache_key(page_dict: dict) -> str:
+    """Unique key of the page cache."""
+    return "/".join((*cache_subdirs(page_dict), strws(page_dict["page_name"])))
+
+
+def generation(page_dict: dict) -> int:
+    """Return number of changes of the cached page data since the start."""
+    return GENERATIONS.get(cache_key(page_dict), 0)
+
+
+def changed(key: str):
+    GENERATIONS[key] = GENERATIONS.get(key, 0) + 1
+
+
+def age(page_dict: dict) -> float:
+    """Return secs since the last update of the cached page data (inf if not cached)."""
+    return STORE.age(cache_key(page_dict))
+
+
+def is_cached(page_dict: dict) -> bool:
+    return STORE.age(cache_key(page_dict)) != float("inf")
+
+
+def is_fresh(page_dict: dict, max_age=CACHE_TTL) -> bool:
+    """Return True if cached page data exists and is not older than max_age secs."""
+    return STORE.age(cache_key(page_dict)) <= max_age
+
+
+def read(page_dict: dict) -> dict:
+    """Read cached page data."""
+    json_data = STORE.read(cache_key(page_dict))
+    if json_data is None:
+        raise KeyError(f"page is not cached: '{cache_key(page_dict)}'")
+    return json_data
+
+
+def read_safe(page_dict: dict) -> dict:
+    """Read cached page data, return empty dict if not cached."""
+    return STORE.read(cache_key(page_dict)) or {}
+
+
+def write(page_dict: dict, json_data: dict):
+    """Write page data to the cache."""
+    key = cache_key(page_dict)
+    STORE.write(key, json_data)
+    changed(key)
+
+
+def append(page_dict: dict, entries: list, pagination: dict):
+    """Append entries of the next page of data to the cached page data."""
+    key = cache_key(page_dict)
+    STORE.append(key, entries, pagination)
+    changed(key)
+
+
+def refresh(page_dict: dict, on_data: Callable = lambda json_data: None) -> tuple:
+    """Fetch page data, call on_data (e.g. to download thumbnails) & update cache.
+    Page data is requested conditionally by the validators of the cached page data.
+    Concurrent refreshes of the same page are coalesced into one.
+    Return tuple: (json_data, result of on_data).
+    """
+    def fetch() -> tuple:
+        cached = read_safe(page_dict)
+        json_data = data.page_data(page_dict, validators=cached.get(data.VALIDATORS))
+        modified = not data.not_modified(json_data)
+        if not modified:  # 304 => cache hit
+            json_data = cached
+        extra = on_data(json_data)
+        if modified:
+            write(page_dict, json_data)
+        else:
+            STORE.touch(cache_key(page_dict))  # refresh only the update time
+        return json_data, extra
+    return FLIGHT.do(cache_key(page_dict), fetch)
+
+
+def get(page_dict: dict, max_age=CACHE_TTL) -> dict:
+    """Return page data from the cache if fresh, otherwise fetch & cache it.
+    If offline => return outdated cached page data (empty dict if not cached).
+    """
+    if is_fresh(page_dict, max_age):
+        return read(page_dict)
+    if not CLIENT.is_online():
+        return read_safe(page_dict)
+    try:
+        json_data, _ = refresh(page_dict)
+    except NETWORK_ERRORS:
+        return read_safe(page_dict)  # network is not reachable => serve outdated cache
+    return json_data
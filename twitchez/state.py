@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from configparser import ConfigParser
+from pathlib import Path
+from threading import RLock, Timer
+
+import atexit
+import os
+
+# secs without changes, after which changed state is written to the file
+WRITE_DELAY = 1.0
+
+
+class StateFile:
+    """State file (ConfigParser format) read once & changed in memory.
+    Changes are written to the file atomically after WRITE_DELAY secs
+    without other changes (debounced) and on exit.
+    """
+
+    def __init__(self, path: Path, preserve_case=False):
+        self.path = Path(path)
+        self.parser = ConfigParser()
+        if preserve_case:
+            # fix: preserve capitalization (option as is without transformation)
+            self.parser.optionxform = lambda option: option
+        self.parser.read(self.path)
+        self.lock = RLock()
+        self.timer = None
+        self.changed = False
+
+    def get(self, section: str, option: str, fallback=None):
+        with self.lock:
+            return self.parser.get(section, option, fallback=fallback)
+
+    def items(self, section: str) -> list:
+        """Return a list of (name, value) tuples for each option in a section."""
+        with self.lock:
+            if not self.parser.has_section(section):
+                return []
+            return self.parser.items(section)
+
+    def set(self, section: str, option: str, value):
+        with self.lock:
+            if not self.parser.has_section(section):
+                self.parser.add_section(section)
+            if self.parser.get(section, option, fallback=None) == str(value):
+                return  # not changed
+            self.parser.set(section, option, str(value))
+            self.write_later()
+
+    def remove(self, section: str, option: str):
+        with self.lock:
+            if self.parser.has_section(section) and self.parser.remove_option(section, option):
+                self.write_later()
+
+    def write_later(self):
+        """Write state to the file, if there are no other changes during WRITE_DELAY secs."""
+        self.changed = True
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = Timer(WRITE_DELAY, self.flush)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def flush(self):
+        """Write changed state to the file now (atomically)."""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.changed:
+                return
+            tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+            with open(tmp_path, "w") as f:
+                self.parser.write(f, space_around_delimiters=False)
+            os.replace(tmp_path, self.path)
+            self.changed = False
+
+
+FILES: dict[Path, StateFile] = {}
+LOCK = RLock()
+
+
+def state_file(path: Path, preserve_case=False) -> StateFile:
+    """Return state of the file (file is read only once)."""
+    path = Path(path)
+    with LOCK:
+        if path not in FILES:
+            FILES[path] = StateFile(path, preserve_case)
+        return FILES[path]
+
+
+def flush():
+    """Write all changed states to the files."""
+    with LOCK:
+        for sf in FILES.values():
+            sf.flush()
+
+
+atexit.register(flush)
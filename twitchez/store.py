@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from pathlib import Path
+from threading import local
+from time import time
+from twitchez import fs
+
+import json
+import sqlite3
+
+# only these fields of the page data entries are stored (used for drawing/actions)
+FIELDS = (
+    "id",
+    "title",
+    "user_login",
+    "user_name",
+    "broadcaster_name",
+    "creator_name",
+    "game_name",
+    "created_at",
+    "published_at",
+    "viewer_count",
+    "view_count",
+    "duration",
+    "url",
+    "thumbnail_url",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    key TEXT PRIMARY KEY,
+    updated REAL NOT NULL,
+    cursor TEXT NOT NULL DEFAULT '',
+    validators TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (key, pos)
+) WITHOUT ROWID;
+"""
+
+
+def remove_json_cache(cache_dir: Path):
+    """Remove page data json files of the old cache (dir per page type) & their empty dirs."""
+    for path in cache_dir.rglob("*.json"):
+        path.unlink(missing_ok=True)
+    for path in sorted(cache_dir.rglob("*"), key=lambda p: len(p.parts), reverse=True):
+        if path.is_dir() and not any(path.iterdir()):
+            path.rmdir()
+
+
+def project(entry: dict) -> str:
+    """Return compact json string of the entry with the stored fields only."""
+    return json.dumps({f: entry[f] for f in FIELDS if f in entry}, separators=(",", ":"))
+
+
+class PageStore:
+    """Single SQLite database of the cached pages data.
+    Each write is one transaction (no half-written pages if app is killed),
+    entries are indexed by the page key and the position on the page.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.local = local()  # sqlite connection per thread
+
+    def db(self) -> sqlite3.Connection:
+        con = getattr(self.local, "con", None)
+        if con is None:
+            if not self.path.exists():  # first use => old cache is not needed anymore
+                remove_json_cache(self.path.parent)
+            con = sqlite3.connect(self.path, timeout=10)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.executescript(SCHEMA)
+            self.local.con = con
+        return con
+
+    def age(self, key: str) -> float:
+        """Return secs since the last update of the page (inf if not cached)."""
+        row = self.db().execute("SELECT updated FROM pages WHERE key=?", (key,)).fetchone()
+        if row is None:
+            return float("inf")
+        return time() - row[0]
+
+    def read(self, key: str):
+        """Return page data in the helix json format or None if page is not cached."""
+        con = self.db()
+        row = con.execute("SELECT cursor, validators FROM pages WHERE key=?", (key,)).fetchone()
+        if row is None:
+            return None
+        cursor, validators = row
+        rows = con.execute("SELECT data FROM entries WHERE key=? ORDER BY pos", (key,))
+        json_data = {
+            "data": [json.loads(d) for d, in rows],
+            "pagination": {"cursor": cursor} if cursor else {},
+        }
+        validators = json.loads(validators)
+        if validators:
+            json_data["validators"] = validators
+        return json_data
+
+    def write(self, key: str, json_data: dict):
+        """Replace page data."""
+        cursor = json_data.get("pagination", {}).get("cursor", "")
+        validators = json.dumps(json_data.get("validators", {}))
+        rows = [(key, pos, e["id"], project(e)) for pos, e in enumerate(json_data["data"])]
+        with self.db() as con:  # transaction
+            con.execute("DELETE FROM entries WHERE key=?", (key,))
+            con.executemany("INSERT INTO entries VALUES (?, ?, ?, ?)", rows)
+            con.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)", (key, time(), cursor, validators))
+
+    def append(self, key: str, entries: list, pagination: dict):
+        """Append entries (next page of data) to the end of page & set the cursor."""
+        cursor = pagination.get("cursor", "")
+        with self.db() as con:  # transaction
+            row = con.execute("SELECT COALESCE(MAX(pos) + 1, 0) FROM entries WHERE key=?", (key,)).fetchone()
+            start = row[0]
+            rows = [(key, start + i, e["id"], project(e)) for i, e in enumerate(entries)]
+            con.executemany("INSERT INTO entries VALUES (?, ?, ?, ?)", rows)
+            con.execute("UPDATE pages SET cursor=? WHERE key=?", (cursor, key))
+
+    def touch(self, key: str):
+        """Mark page data as just updated (e.g. not modified since the last update)."""
+        with self.db() as con:
+            con.execute("UPDATE pages SET updated=? WHERE key=?", (time(), key))
+
+
+STORE: PageStore = PageStore(Path(fs.get_cache_dir(), "pages.db"))
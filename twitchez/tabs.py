@@ -2,6 +2,7 @@
 # coding=utf-8
 
 from ast import literal_eval
+from functools import lru_cache
 from pathlib import Path
 from twitchez import conf
 from twitchez import fs
@@ -13,6 +14,12 @@ LTABS = "LTABS"
 DTABS = "DTABS"
 
 
+@lru_cache(maxsize=128)
+def literal(string: str):
+    """Return evaluated literal (parsed once per string)."""
+    return literal_eval(string)
+
+
 def tabs_list() -> list:
     """Return list of tabs (name, dict) tuples."""
     return conf.dta_list(DTABS, FILE)
@@ -27,7 +34,7 @@ def tab_names_ordered() -> list:
     """Return an ordered list of opened tab names."""
     names_list_str = conf.dta_get("ltabs", "", LTABS, FILE)
     try:
-        names_list = literal_eval(names_list_str)
+        names_list = list(literal(names_list_str))  # copy => may be changed by the caller
     except Exception as e:
         raise ValueError(f"names_list_str: '{names_list_str}'\n{e}")
     return names_list
@@ -81,7 +88,7 @@ def pdict(page_name="") -> dict:
     if not pdict_str or pdict_str == paged.FLPN or page_name == paged.FLPN:
         return paged.following_live()  # fallback to following live page
     try:
-        page_dict = literal_eval(pdict_str)
+        page_dict = dict(literal(pdict_str))  # copy => may be changed by the caller
     except Exception as e:
         raise ValueError(f"pdict_str: '{pdict_str}'\n{e}")
     return page_dict
@@ -154,3 +161,17 @@ def prev_tab() -> tuple[dict, str]:
     pindex = cindex - 1
     ptabname = tabs[pindex]
     return pdict(ptabname), ptabname
+
+
+def neighbour_tabs(count=1) -> list:
+    """Return list of tab names next to the current tab (count on each side)."""
+    tabs = tab_names_ordered()
+    if len(tabs) < 2:
+        return []
+    cindex = tabs.index(cpname())
+    names = []
+    for i in range(1, count + 1):
+        for tabname in (tabs[(cindex + i) % len(tabs)], tabs[(cindex - i) % len(tabs)]):
+            if tabname != tabs[cindex] and tabname not in names:
+                names.append(tabname)
+    return names
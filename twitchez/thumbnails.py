@@ -4,24 +4,51 @@
 from twitchez import command
 from twitchez import conf
 from twitchez import fs
-from twitchez import utils
+from twitchez import settings
+from twitchez.bandwidth import METER, SCALE, Sample
+from twitchez.api import CLIENT, PROBE_INTERVAL, conditional_headers, response_validators, timeouts
+from twitchez.imagecache import CACHE, image_key
 
 from pathlib import Path
 from shutil import which
-from sys import version_info, stdout
-from threading import Timer
+from concurrent.futures import Future
+from sys import stdout
+from tempfile import mkstemp
+from threading import Condition, Lock, Thread, Timer
+from time import monotonic
 
 import aiohttp
 import asyncio
+import atexit
 import json
 import os                       # listdir, sep, devnull, basename, splitext
 import subprocess
 
 
 # check if executables at PATH
-HAS_UEBERZUG = bool(which("ueberzugpp")) | bool(which("ueberzug"))
-# also check user cmd in case executable provided via full path
-HAS_UEBERZUG |= command.conf_cmd_check("ueberzug_cmd")[0]
+HAS_UEBERZUG = settings.has_ueberzug()
+
+# number of screens before/after the visible one, thumbnails of which are downloaded while idle
+PREFETCH_SCREENS = 1
+
+# secs after which downloaded thumbnail is requested again (live thumbnails are updated by twitch)
+THUMBNAIL_TTL = 300
+
+# secs before the failed thumbnail is requested again (doubled on each next failure)
+RETRY_DELAY = 2
+
+# max number of simultaneous connections to the thumbnails host (static-cdn.jtvnw.net)
+LIMIT_PER_HOST = 10
+# secs to keep idle connections open / resolved hosts cached
+KEEPALIVE_TIMEOUT = 60
+DNS_CACHE_TTL = 300
+
+# max number of thumbnails fetched simultaneously
+FETCH_WORKERS = 8
+# max secs for the whole request of one thumbnail
+FETCH_DEADLINE = 15
+# max size of the response chunks written to the file
+CHUNK_SIZE = 64 * 1024
 
 
 def raise_user_note():
@@ -60,86 +87,26 @@ def get_ueberzug_cmd() -> list:
 def text_mode() -> int:
     """Text mode: 0 => thumbnails mode (min: 0, max: 3).
     [1-3] => do not do anything with thumbnails do not even download them!
-    The higher the value, the more rows of cells there will be in the grid.
     """
-    tm = int(conf.setting("text_mode"))
-    if tm < 0:
-        tm = 0
-    elif tm > 3:
-        tm = 3
-    # explicit text mode if ueberzug not found (optional dependency)
-    if not HAS_UEBERZUG and tm < 1:
-        tm = 1
-    return tm
-
-
-def rdiv() -> int:
-    """Thumbnail resolution divisor (min: 2, max: 10)."""
-    div = 1 + int(conf.setting("grid_size"))
-    if div < 2:
-        div = 2
-    elif div > 10:
-        div = 10
-    return div
+    return settings.CURRENT.text_mode
 
 
 def container_size(thumbnail=False) -> tuple[int, int]:
-    """Return tuple: (width, height) - based on divisor key in table.
-    Selected values are close as possible to the real resolution of the thumbnails.
-    Except couple values where visual result more appropriate: with (2,3,4) as divisor.
-    """
-    table = {
-        10: (24, 7),
-        9: (27, 8),
-        8: (30, 9),
-        7: (35, 10),
-        6: (40, 11),
-        5: (48, 13),
-        4: (56, 15),
-        3: (76, 20),
-        2: (90, 24),
-    }
-    # use fallback key if div key not found
-    _def_fix: tuple = (40, 11)  # fix: None is not assignable
-    w, h = tuple(table.get(rdiv(), table.get(6, _def_fix)))
-    # width/height modifier for perfect placement of thumbnails in the grid (very font dependent)
-    w += int(conf.setting("wmod"))
-    h += int(conf.setting("hmod"))
-    tm = text_mode()
-    if tm:
-        return w, h - tm
-    elif thumbnail:
-        return w, h
-    else:
-        NLC = 3  # num of content lines in the box
-        return w, h + NLC
+    """Return tuple: (width, height) of the box or thumbnail in the grid."""
+    if thumbnail:
+        return settings.CURRENT.thumbnail_size
+    return settings.CURRENT.box_size
 
 
-def thumbnail_resolution() -> tuple[int, int]:
-    """Return tuple: (width, height) - based on divisor key in table.
-    really simple:  divisor = 10
-    (1920, 1080) / 10 = (192, 108)
-    The only values that don't match the actual result: divisor=2.
-    """
-    table = {
-        10: (192, 108),
-        9: (213, 120),
-        8: (240, 135),
-        7: (274, 154),
-        6: (320, 180),
-        5: (384, 216),
-        4: (480, 270),
-        3: (640, 360),
-        2: (720, 405),  # actual (960, 540) is overkill!
-    }
-    # use fallback key if div key not found
-    _def_fix: tuple = (320, 180)  # fix: None is not assignable
-    return table.get(rdiv(), table.get(6, _def_fix))
-
-
-def get_thumbnail_urls(rawurls) -> list:
+def thumbnail_resolution(scale=1) -> tuple[int, int]:
+    """Return tuple: (width, height) of the thumbnails in pixels (divided by scale)."""
+    width, height = settings.CURRENT.thumbnail_resolution
+    return width // scale, height // scale
+
+
+def get_thumbnail_urls(rawurls, scale=1) -> list:
     """Return thumbnail urls with {width} and {height} replaced."""
-    width, height = thumbnail_resolution()
+    width, height = thumbnail_resolution(scale)
     urls = []
     for url in rawurls:
         # fix: video thumbnails currently have weird format with % characters
@@ -154,97 +121,334 @@ def get_thumbnail_urls(rawurls) -> list:
     return urls
 
 
-async def fetch_image(session, url):
-    """Asynchronously fetch image from url."""
-    if not url:
-        return None
-    async with session.get(url) as response:
-        return await response.read()
+def thumbnail_keys(rawurls: list, scale=1) -> list:
+    """Return cache keys of the thumbnails ("" if thumbnail has no url)."""
+    resolution = thumbnail_resolution(scale)
+    return [image_key(url, resolution) if url else "" for url in rawurls]
 
 
-async def get_thumbnails_async(ids: list, rawurls: list, *subdirs) -> dict:
-    """Asynchronously download thumbnails and return paths.
-    (Actual realization)
+def cached_keys(rawurls: list, max_scale: int) -> list:
+    """Return cache keys of the cached thumbnails in the best resolution
+    (divided by not more than max_scale), key of the max_scale resolution if not cached.
+    """
+    scales = sorted(scale for scale in set(SCALE.values()) if scale <= max_scale)
+    candidates = [thumbnail_keys(rawurls, scale) for scale in scales]
+    keys = []
+    for i in range(len(rawurls)):
+        found = [ks[i] for ks in candidates if ks[i] and CACHE.file(ks[i]).is_file()]
+        keys.append(found[0] if found else candidates[-1][i])
+    return keys
+
+
+def cache_size() -> int:
+    """Max size of the thumbnails cache in bytes."""
+    return int(conf.setting("thumbnails_cache_size")) * 1024 * 1024
+
+
+class IOLoop:
+    """Long-lived asyncio event loop in the background thread,
+    which owns one http session shared by all thumbnails downloads.
+    Connections (and resolved hosts) stay warm between the page loads.
+    Coroutines are submitted from other threads, results are returned via futures.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.session = None
+        self.workers = None
+        self.lock = Lock()
+
+    def start(self):
+        with self.lock:
+            if self.loop is not None:
+                return
+            self.loop = asyncio.new_event_loop()
+            Thread(target=self.loop.run_forever, daemon=True).start()
+
+    def submit(self, coro) -> Future:
+        """Run coroutine in the loop thread and return concurrent future of the result."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """Return shared session (created on the first use, only in the loop thread)."""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=LIMIT_PER_HOST,
+                                             keepalive_timeout=KEEPALIVE_TIMEOUT,
+                                             ttl_dns_cache=DNS_CACHE_TTL)
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    def get_workers(self) -> asyncio.Semaphore:
+        """Return semaphore which limits the number of simultaneous fetches."""
+        if self.workers is None:
+            self.workers = asyncio.Semaphore(FETCH_WORKERS)
+        return self.workers
+
+    def close(self):
+        """Close shared session (on exit)."""
+        if self.loop is None or self.session is None:
+            return
+        try:
+            self.submit(self.session.close()).result(timeout=1)
+        except Exception:
+            pass  # exiting anyway
+
+
+LOOP = IOLoop()
+atexit.register(LOOP.close)
+
+
+async def fetch_thumbnail(session, url: str, path: Path, headers=None, sample=None) -> tuple[int, dict]:
+    """Asynchronously fetch thumbnail from url and stream it to the file.
+    Image is written to the temp file by chunks (off the loop), the file is replaced
+    atomically only when the whole image is received => readers never see partial image.
+    Latency, transfer time & received bytes are added to the sample (if provided).
+    Return tuple: (status, response validators).
+    status: -1 => network error/timeout (previous file is kept).
     """
+    sample = sample or Sample()
+    if not url:
+        return 0, {}
+    connect, read = timeouts()
+    client_timeout = aiohttp.ClientTimeout(total=FETCH_DEADLINE, sock_connect=connect, sock_read=read)
+    tmp_path = None  # unique per fetch => concurrent fetches of the same image do not collide
+    async with LOOP.get_workers():
+        start = monotonic()
+        try:
+            async with session.get(url, headers=headers, timeout=client_timeout) as response:
+                sample.latencies.append(monotonic() - start)
+                validators = response_validators(response.headers)
+                if response.status != 200:  # e.g. 304 => not modified
+                    return response.status, validators
+                fd, tmp = await asyncio.to_thread(mkstemp, prefix=f"{path.name}.", suffix=".part", dir=path.parent)
+                tmp_path = Path(tmp)
+                file = os.fdopen(fd, "wb")
+                transfer_start = monotonic()
+                try:
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        sample.nbytes += len(chunk)
+                        await asyncio.to_thread(file.write, chunk)
+                finally:
+                    sample.transfers.append((transfer_start, monotonic()))
+                    await asyncio.to_thread(file.close)
+            await asyncio.to_thread(os.replace, tmp_path, path)
+            tmp_path = None
+            return response.status, validators
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+            return -1, {}  # network error/timeout or file was not written
+        finally:
+            if tmp_path is not None:
+                await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+
+
+def store_results(ids: list, keys: list, urls: dict, results: dict, entries: dict, immutable: bool) -> dict:
+    """Update cache index by the fetch results and return thumbnail paths."""
+    blank_thumbnail = str(Path(conf.glob_conf_dir, "blank.jpg"))
+    for key, (status, validators) in results.items():
+        if status == 200:
+            CACHE.put(key, urls[key], validators, immutable)
+        elif status == 304:
+            CACHE.touch(key)  # not modified
+        else:
+            CACHE.count("failed")
+    CACHE.count("hits", len([key for key in entries if key not in results]))
     thumbnail_paths = {}
-    urls = get_thumbnail_urls(rawurls)
-    tmpd = fs.get_tmp_dir("thumbnails", *subdirs)
-    blank_thumbnail = Path(conf.glob_conf_dir, "blank.jpg")
-    tasks = []
-    async with aiohttp.ClientSession() as session:
-        for url in urls:
-            tasks.append(fetch_image(session, url))
-        # wait until all thumbnails with non empty url are fetched
-        thumbnails = await asyncio.gather(*tasks)
-
-    for tid, thumbnail in zip(ids, thumbnails):
-        thumbnail_fname = f"{tid}.jpg"
-        thumbnail_path = Path(tmpd, thumbnail_fname)
-        if thumbnail is None:
-            if thumbnail_path.is_file() and thumbnail_path.samefile(blank_thumbnail):
-                pass
-            else:
-                # remove symlink or file before creating new symlink
-                if thumbnail_path.is_file():
-                    thumbnail_path.unlink(missing_ok=True)
-                # create symlink of blank_thumbnail
-                thumbnail_path.symlink_to(blank_thumbnail)
+    for tid, key in zip(ids, keys):
+        if key in results:
+            status = results[key][0]
+            # network error => keep previously downloaded thumbnail
+            cached = status in (200, 304) or (status < 0 and key in entries)
         else:
-            # NOTE: if existing thumbnail_path is symlink, original blank thumbnail
-            # will be replaced by the thumbnail_path image, to prevent that
-            # => remove symlink before writing new image file
-            if thumbnail_path.is_symlink():
-                thumbnail_path.unlink(missing_ok=True)
-            with open(thumbnail_path, 'wb') as f:
-                f.write(thumbnail)
-        thumbnail_paths[tid] = str(thumbnail_path)
+            cached = key in entries
+        thumbnail_paths[tid] = str(CACHE.file(key)) if cached else blank_thumbnail
+    CACHE.evict(cache_size())
     return thumbnail_paths
 
 
-def download_thumbnails(ids: list, rawurls: list, *subdirs) -> dict:
+async def get_thumbnails_async(ids: list, rawurls: list, immutable=False) -> dict:
     """Asynchronously download thumbnails and return paths.
-    (Wrapper with asyncio run/run_until_complete)
+    Cached thumbnails are requested conditionally, cached immutable thumbnails (videos & clips)
+    and thumbnails fetched less than THUMBNAIL_TTL secs ago (e.g. on the other tab) are not requested.
+    On slow network thumbnails are requested in lower resolution (by the measured throughput),
+    thumbnails cached in higher resolution are used without requests.
+    Thumbnails are fetched by the limited number of workers, disk I/O is done off the loop.
+    (Actual realization)
     """
-    if version_info >= (3, 7):  # Python 3.7+
-        return asyncio.run(get_thumbnails_async(ids, rawurls, *subdirs))
-    else:  # Python 3.5-3.6
-        loop = asyncio.get_event_loop()
-        try:
-            return loop.run_until_complete(get_thumbnails_async(ids, rawurls, *subdirs))
-        finally:
-            loop.close()
-
+    scale = METER.scale()
+    wanted = thumbnail_keys(rawurls, scale)
+    keys = wanted
+    if scale > 1:
+        keys = await asyncio.to_thread(cached_keys, rawurls, scale)
+    entries = await asyncio.to_thread(CACHE.lookup, keys)
+    fetch = {}  # key -> (url, headers) of the thumbnails to request (once per key)
+    for key, want, url in zip(keys, wanted, get_thumbnail_urls(rawurls, scale)):
+        entry = entries.get(key)
+        if not key or key in fetch or key != want or (entry and entry.is_fresh(THUMBNAIL_TTL)):
+            continue
+        fetch[key] = (url, conditional_headers(entry.validators) if entry else None)
+    session = LOOP.get_session()
+    sample = Sample()
+    tasks = [fetch_thumbnail(session, url, CACHE.file(key), headers, sample)
+             for key, (url, headers) in fetch.items()]
+    # wait until all requested thumbnails are fetched (failure of one => -1 for it only)
+    outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+    results = {key: (-1, {}) if isinstance(outcome, BaseException) else outcome
+               for key, outcome in zip(fetch, outcomes)}
+    if fetch:
+        METER.add(sample)
+    urls = {key: url for key, (url, _) in fetch.items()}
+    return await asyncio.to_thread(store_results, ids, keys, urls, results, entries, immutable)
+
+
+def download_thumbnails(ids: list, rawurls: list, immutable=False) -> dict:
+    """Asynchronously download thumbnails and return paths.
+    (Wrapper: job is run in the background loop, wait for the result)
+    """
+    return LOOP.submit(get_thumbnails_async(ids, rawurls, immutable)).result()
 
-def find_thumbnails(ids: list, *subdirs) -> dict:
-    """Find and return previously downloaded thumbnails paths."""
-    tmpd = fs.get_tmp_dir("thumbnails", *subdirs)
-    blank_thumbnail = Path(conf.glob_conf_dir, "blank.jpg")
 
-    tnames = utils.replace_pattern_in_all(os.listdir(tmpd), ".jpg", "")
-    differ = list(set(tnames).difference(set(ids)))
-    fnames = utils.add_str_to_list(differ, ".jpg")  # add file extension back
-    for fname in fnames:
-        # remove thumbnail files/symlinks which id not in ids list
-        Path(tmpd, fname).unlink(missing_ok=True)
+class FetchQueue:
+    """Thumbnails of the current page to download, ordered by the distance from the viewport.
+    Visible thumbnails are downloaded first, screens around the visible one only while idle,
+    thumbnails far from the viewport are not downloaded until scrolled near.
+    Downloaded thumbnails are passed to the on_fetched callback of the page.
+    """
 
-    thumbnail_list = utils.insert_to_all(os.listdir(tmpd), tmpd, opt_sep=os.sep)
+    def __init__(self):
+        self.cond = Condition()
+        self.key = None  # cache key of the current page
+        self.immutable = False  # thumbnails of the page never change (videos & clips)
+        self.ids = []
+        self.urls = {}  # id -> raw thumbnail url
+        self.on_fetched = None
+        self.fetched: dict[str, dict] = {}  # cache key -> {id: monotonic time of the download}
+        self.failures: dict[str, dict] = {}  # cache key -> {id: number of failed downloads in a row}
+        self.start = 0  # index of the first visible entry
+        self.total = 0  # max number of visible entries
+        self.screens = 0  # number of screens before/after the visible one to download
+        self.busy = False  # thumbnails are being downloaded
+        self.thread = None
+
+    def show(self, key: str, immutable: bool, ids: list, urls: dict, start: int, total: int, on_fetched):
+        """Set page & viewport which thumbnails should be downloaded.
+        on_fetched(paths: dict, visible: bool) is called from the download thread.
+        """
+        with self.cond:
+            if (key, start, total) != (self.key, self.start, self.total):
+                self.screens = 0  # scrolled => only visible thumbnails until idle
+            self.key, self.immutable, self.ids, self.urls = key, immutable, ids, urls
+            self.start, self.total = start, total
+            self.on_fetched = on_fetched
+            if self.thread is None:
+                self.thread = Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def prefetch(self):
+        """Download also thumbnails of the screens around the visible one (call while idle)."""
+        with self.cond:
+            self.screens = PREFETCH_SCREENS
+            self.cond.notify()
+
+    def distance(self, index: int) -> int:
+        """Distance of the entry from the viewport in entries (0 => visible)."""
+        return max(self.start - index, index - (self.start + self.total - 1), 0)
+
+    def window(self) -> range:
+        """Return indexes of the entries which thumbnails should be downloaded now."""
+        # slow network => only visible thumbnails
+        span = 0 if METER.viewport_only() else self.total * self.screens
+        return range(max(0, self.start - span), min(len(self.ids), self.start + self.total + span))
+
+    def next_batch(self) -> list:
+        """Return ids to download next: not downloaded (or outdated) ids nearest to the viewport."""
+        if self.key is None or not self.total:
+            return []
+        fetched = self.fetched.setdefault(self.key, {})
+        now = monotonic()
+        due = [i for i in self.window() if now - fetched.get(self.ids[i], -THUMBNAIL_TTL) >= THUMBNAIL_TTL]
+        due.sort(key=self.distance)
+        return [self.ids[i] for i in due[:self.total]]
+
+    def retry_wait(self):
+        """Return secs till the retry of the failed thumbnail nearest to the viewport (None => no retries)."""
+        fetched = self.fetched.get(self.key, {})
+        failures = self.failures.get(self.key, {})
+        ids = [self.ids[i] for i in self.window() if self.ids[i] in failures]
+        if not ids:
+            return None
+        return max(min(fetched[id] for id in ids) + THUMBNAIL_TTL - monotonic(), 0)
+
+    def done(self, key: str, batch: list, paths: dict):
+        """Record downloaded thumbnails of the batch, failed ones are due again after the backoff."""
+        blank_thumbnail = str(Path(conf.glob_conf_dir, "blank.jpg"))
+        now = monotonic()
+        fetched = self.fetched.setdefault(key, {})
+        failures = self.failures.setdefault(key, {})
+        for id in batch:
+            if paths.get(id, blank_thumbnail) != blank_thumbnail:
+                fetched[id] = now
+                failures.pop(id, None)
+                continue
+            failures[id] = failures.get(id, 0) + 1
+            delay = min(RETRY_DELAY * 2 ** (failures[id] - 1), THUMBNAIL_TTL)
+            fetched[id] = now - THUMBNAIL_TTL + delay  # => due again after delay
+
+    def run(self):
+        """Download thumbnails by batches (in the background thread)."""
+        while True:
+            with self.cond:
+                batch = self.next_batch()
+                while not batch:
+                    self.busy = False
+                    self.cond.wait(self.retry_wait())
+                    batch = self.next_batch()
+                self.busy = True
+                key, immutable, on_fetched = self.key, self.immutable, self.on_fetched
+                rawurls = [self.urls.get(id, "") for id in batch]
+            if not CLIENT.is_online():
+                with self.cond:
+                    self.busy = False
+                    self.cond.wait(PROBE_INTERVAL)
+                continue
+            quality = METER.quality()
+            try:
+                paths = download_thumbnails(batch, rawurls, immutable)
+            except Exception:
+                paths = {}  # not critical, previously downloaded thumbnails are kept
+            with self.cond:
+                self.done(key, batch, paths)
+                if METER.quality() < quality:
+                    # network is faster => download in better quality again
+                    self.fetched.clear()
+                    self.failures.clear()
+                shown = self.ids[self.start:self.start + self.total]
+                visible = key == self.key and not set(shown).isdisjoint(paths)
+            if paths:
+                on_fetched(paths, visible)
+
+
+QUEUE = FetchQueue()
+
+
+def find_thumbnails(ids: list, rawurls: list) -> dict:
+    """Find and return paths of the previously downloaded (cached) thumbnails in the best resolution.
+    Path of the blank thumbnail is returned for not yet downloaded thumbnails.
+    """
+    blank_thumbnail = str(Path(conf.glob_conf_dir, "blank.jpg"))
     thumbnail_paths = {}
-    for path in thumbnail_list:
-        tid = os.path.basename(os.path.splitext(path)[0])  # file basename without .ext
-        thumbnail_paths[tid] = path
-    # fix: if thumbnail_paths does not have id from ids
-    # this usually happens if text mode without thumbnails was previously set
-    for tid in ids:
-        if tid not in thumbnail_paths.keys():
-            thumbnail_paths[tid] = str(blank_thumbnail)
+    for tid, key in zip(ids, cached_keys(rawurls, max(SCALE.values()))):
+        path = CACHE.file(key)
+        thumbnail_paths[tid] = str(path) if key and path.is_file() else blank_thumbnail
     return thumbnail_paths
 
 
 class Thumbnail:
     """Prepare Thumbnail ueberzug parameters and add to Thumbnails."""
-    w, h = container_size(thumbnail=True)
 
     def __init__(self, identifier, img_path, x, y):
+        self.w, self.h = container_size(thumbnail=True)
         self.identifier = identifier
         self.img_path = img_path
         self.x = x
@@ -272,7 +476,6 @@ class Thumbnail:
 
 class Thumbnails:
     uepl: list[dict[str, str]] = []  # ueberzug list of thumbnail parameters
-    tm = text_mode()
 
     is_initialized = False
     working_dir = fs.get_tmp_dir()
@@ -351,13 +554,13 @@ class Thumbnails:
 
     def start(self):
         """Start drawing images via subprocess."""
-        if self.tm:
+        if text_mode():
             return
         self.execute()
 
     def finish(self, safe=False):
         """Finish drawing images and optionally terminate subprocess."""
-        if self.tm:
+        if text_mode() and not self.uepl:
             return
         self.clear()
         if safe:
@@ -4,32 +4,9 @@
 from twitchez import STDSCR
 from datetime import datetime
 from difflib import SequenceMatcher
-from os.path import getmtime
-from re import compile
-from twitchez import conf
-import textwrap
-import time
-
-
-# visible length of one emoji in terminal cells
-EMOJI_CELLS = int(conf.setting("emoji_cells"))
-
-EMOJI_PATTERN = compile(
-    "["
-    "\U0001F1E0-\U0001F1FF"  # flags (iOS)
-    "\U0001F300-\U0001F5FF"  # symbols & pictographs
-    "\U0001F600-\U0001F64F"  # emoticons
-    "\U0001F680-\U0001F6FF"  # transport & map symbols
-    "\U0001F700-\U0001F77F"  # alchemical symbols
-    "\U0001F780-\U0001F7FF"  # Geometric Shapes Extended
-    "\U0001F800-\U0001F8FF"  # Supplemental Arrows-C
-    "\U0001F900-\U0001F9FF"  # Supplemental Symbols and Pictographs
-    "\U0001FA00-\U0001FA6F"  # Chess Symbols
-    "\U0001FA70-\U0001FAFF"  # Symbols and Pictographs Extended-A
-    "\U00002702-\U000027B0"  # Dingbats
-    "\U000024C2-\U0001F251"
-    "]+"
-)
+from functools import lru_cache
+from twitchez import settings
+import unicodedata
 
 
 def tryencoding(string: str) -> str:
@@ -43,24 +20,52 @@ def tryencoding(string: str) -> str:
     return string
 
 
-def demojize(str: str) -> str:
-    """Return string without emojis."""
-    return EMOJI_PATTERN.sub(r'', str)
+@lru_cache(maxsize=None)
+def char_width(ch: str) -> int:
+    """Return visible width of the character in terminal cells (wcwidth-like).
+    0 => control, combining & format characters,
+    2 => east asian wide/fullwidth characters (emoji: emoji_cells setting),
+    1 => all other characters.
+    """
+    cp = ord(ch)
+    if 0x20 <= cp < 0x7F:
+        return 1
+    if cp < 0xA0:  # C0/C1 control characters
+        return 0
+    if unicodedata.category(ch) in ("Mn", "Me", "Cf") or 0x1160 <= cp <= 0x11FF:
+        return 0  # combining marks, zero width format characters, hangul jungseong/jongseong
+    if 0x1F3FB <= cp <= 0x1F3FF:
+        return 0  # emoji skin tone modifiers (drawn combined with the previous emoji)
+    if unicodedata.east_asian_width(ch) in ("W", "F"):
+        if 0x1F000 <= cp <= 0x1FAFF:  # pictographs & emoji
+            return settings.CURRENT.emoji_cells
+        return 2
+    return 1
+
+
+def reset_widths():
+    """Forget cached widths of the characters & title layouts (e.g. emoji_cells was changed)."""
+    char_width.cache_clear()
+    layout_title.cache_clear()
 
 
-def emoji_count(str: str) -> int:
-    """Returns the count of emojis in a string."""
-    return len(str) - len(demojize(str))
+def tlen(str: str) -> int:
+    """Return len of str in terminal cells (visible width)."""
+    if str.isascii():
+        return len(str)  # fast path: one cell per character
+    return sum(map(char_width, str))
 
 
-def tlen(str: str) -> int:
-    """Return len of str respecting emoji visible length in terminal cells.
-    EMOJI_CELLS: visible length of one emoji in terminal cells.
-    """
-    if EMOJI_CELLS < 2:
-        return len(str)
-    else:
-        return EMOJI_CELLS * emoji_count(str) + len(demojize(str))
+def cells_slice(str: str, width: int) -> str:
+    """Return the longest beginning of str which fits in width terminal cells."""
+    if str.isascii():
+        return str[:width]
+    cells = 0
+    for i, ch in enumerate(str):
+        cells += char_width(ch)
+        if cells > width:
+            return str[:i]
+    return str
 
 
 def was_resized(xysum=0) -> int:
@@ -82,35 +87,6 @@ def was_resized(xysum=0) -> int:
         return was_resized_between_calls()
 
 
-def secs_since_mtime(path):
-    """time_now - target_mtime = int(secs)."""
-    return int(time.time() - getmtime(path))
-
-
-def replace_pattern_in_all(inputlist, oldstr, newstr) -> list:
-    """Replace oldstr with newstr in all items from a list."""
-    outputlist = []
-    for e in inputlist:
-        outputlist.append(str(e).replace(oldstr, newstr))
-    return outputlist
-
-
-def add_str_to_list(input_list, string) -> list:
-    """Add string to the end of all elements in a list."""
-    outputlist = [e + str(string) for e in input_list]
-    return outputlist
-
-
-def insert_to_all(list, string, opt_sep="") -> list:
-    """ Insert the string at the beginning of all items in a list. """
-    string = str(string)
-    if opt_sep:
-        string = f"{string}{opt_sep}"
-    string += '% s'
-    list = [string % i for i in list]
-    return list
-
-
 def strws(str: str) -> str:
     """Return a str without whitespaces & slash characters - replaced by '_'."""
     return str.strip().replace(' ', '_').replace('/', '_').replace('\\', '_')
@@ -130,19 +106,33 @@ def strtoolong(str: str, width: int, indicator="..") -> str:
     """Return str slice of width with indicator at the end.
     (to show that the string cannot fit completely in width)
     """
-    if tlen(str) > width:
-        str_fit_in_width = str[:width]
-        # visible width in terminal cells that str occupies
-        terminal_cells = tlen(str_fit_in_width)
-        if terminal_cells > width:
-            ec = emoji_count(str_fit_in_width)
-            cut = ec + len(indicator)
-            out_str = str_fit_in_width[:-cut] + indicator
-        else:
-            out_str = str_fit_in_width[:-len(indicator)] + indicator
-        return out_str
-    else:
+    if tlen(str) <= width:
         return str
+    return cells_slice(str, width - len(indicator)) + indicator
+
+
+def wrap_cells(string: str, width: int) -> list:
+    """Greedy word wrap of the string into lines of width terminal cells,
+    too long words are broken.
+    """
+    lines = []
+    line, cells = "", 0
+    for word in string.split(" "):
+        wcells = tlen(word)
+        if line and cells + 1 + wcells <= width:
+            line, cells = f"{line} {word}", cells + 1 + wcells
+            continue
+        if line:
+            lines.append(line)
+        while wcells > width:  # break long word
+            part = cells_slice(word, width) or word[0]
+            lines.append(part)
+            word = word[len(part):]
+            wcells = tlen(word)
+        line, cells = word, wcells
+    if line:
+        lines.append(line)
+    return lines
 
 
 def word_wrap_title(string: str, width: int, max_len: int, max_lines=3) -> str:
@@ -150,29 +140,35 @@ def word_wrap_title(string: str, width: int, max_len: int, max_lines=3) -> str:
     string = strclean(string)
     if tlen(string) <= width:
         return string
-    title_lines = textwrap.wrap(
-        string, width, max_lines=max_lines,
-        expand_tabs=False, replace_whitespace=True,
-        break_long_words=True, break_on_hyphens=True, drop_whitespace=True
-    )
+    title_lines = wrap_cells(string, width)
+    if len(title_lines) > max_lines:
+        placeholder = " [...]"
+        title_lines = title_lines[:max_lines]
+        title_lines[-1] = cells_slice(title_lines[-1], width - len(placeholder)).rstrip() + placeholder
     out_str = ""
-    cline = 0
     for line in title_lines:
-        cline += 1
-        if len(line) == width:
-            out_str += line
+        if tlen(line) == width:
+            out_str += line  # the next line starts in the terminal automatically
         else:
             out_str += f"{line}\n"
     # limit string len
     if len(out_str) > max_len:
         out_str = out_str[:max_len]
     # add mask only if length of last line met condition
-    if len(title_lines[-1]) < width // 2:
+    if tlen(title_lines[-1]) < width // 2:
         mask = "  "  # mask to differentiate from underlying text
         out_str = out_str[:-len(mask) + 1] + mask
     return out_str
 
 
+@lru_cache(maxsize=4096)
+def layout_title(title: str, width: int, full=False) -> str:
+    """Return title laid out in the box of width (full => word wrapped up to 3 lines)."""
+    if full:
+        return word_wrap_title(title, width, width * 3)
+    return strtoolong(title, width)
+
+
 def sdate(isodate: str) -> str:
     """Take iso date str and return shorten date str."""
     # remove Z character from default twitch date (2021-12-08T11:43:43Z)